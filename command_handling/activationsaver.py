@@ -1,48 +1,132 @@
 import wake
+import json
 import os
+import queue
+import threading
+import time
 
+from wake.metrics import METRICS
 
 FALSE_ACTIVATION_DIR = './wake/data/false_activations'
 TRUE_ACTIVATION_DIR = './wake/data/true_activations'
+# Next index of each kind of activation, so starting doesn't have to list the directories
+INDEX_PATH = './wake/data/activation_index.json'
+MAX_PENDING_SAVES = 16  # Activations waiting to be written before new ones are dropped
 
 
 class ActivationSaver:
-    def __init__(self, sample_size:  int, sample_rate: int):
+    """Saves activations as WAV files on a background thread.
+
+    `save` only queues the audio, so it never waits for the disk. The writer
+    writes everything queued in one batch, reserving the batch's indexes in
+    the index file before writing the files, so an index is never reused even
+    if the program stops mid-batch. If the queue is full the activation is
+    dropped and counted.
+    """
+    dropped: int  # Activations dropped because the queue was full
+
+    def __init__(self, sample_size:  int, sample_rate: int, index_path: str = INDEX_PATH,
+                 max_pending: int = MAX_PENDING_SAVES):
         self.pos_save_dir = TRUE_ACTIVATION_DIR
         self.neg_save_dir = FALSE_ACTIVATION_DIR
+        self.index_path = index_path
 
         # Create the save directories
         for dir in [self.pos_save_dir, self.neg_save_dir]:
-            if not os.path.exists(dir):
-                os.mkdir(dir)
-        
-        self.pos_save_idx = wake.audio_collection.get_greatest_index(
-            self.pos_save_dir) + 1
-        self.neg_save_idx = wake.audio_collection.get_greatest_index(
-            self.neg_save_dir) + 1
+            os.makedirs(dir, exist_ok=True)
+
+        self.pos_save_idx, self.neg_save_idx = self._load_indexes()
         self.sample_size = sample_size
         self.sample_rate = sample_rate
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
 
     def save(self, audio: bytes, correct_activation: bool) -> None:
         """
-        Saves the given audio as a true or false activation.
+        Queues the given audio to be saved as a true or false activation.
         Args:
             audio: the audio to save
             correct_activation: whether the activation was a correct activation
         """
-        if correct_activation:
-            save_dir = self.pos_save_dir
-            index = self.pos_save_idx
-            self.pos_save_idx += 1
-        else:
-            save_dir = self.neg_save_dir
-            index = self.neg_save_idx
-            self.neg_save_idx += 1
-
-        wake.audio_collection.utils.save_wav_file(
-            f'{save_dir}/activation-{index:04d}.wav',
-            self.sample_size,
-            self.sample_rate,
-            audio)
-        print(
-            f'Saved {correct_activation} activation {index} to {save_dir}')
+        try:
+            self._queue.put_nowait((audio, correct_activation))
+        except queue.Full:
+            self.dropped += 1
+            METRICS.increment('activations.dropped')
+            print(f'Dropped {correct_activation} activation, {self._queue.qsize()} saves are already waiting')
+            return
+        METRICS.set_gauge('activations.pending', self._queue.qsize())
+
+    def close(self) -> None:
+        """Writes the activations still waiting, then stops the writer."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Write everything that queued up meanwhile with one index update
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self._write([save for save in batch if save is not None])
+            METRICS.set_gauge('activations.pending', self._queue.qsize())
+            if stop:
+                return
+
+    def _write(self, batch: list) -> None:
+        if not batch:
+            return
+        start = time.perf_counter()
+        files = []
+        for audio, correct_activation in batch:
+            if correct_activation:
+                save_dir = self.pos_save_dir
+                index = self.pos_save_idx
+                self.pos_save_idx += 1
+            else:
+                save_dir = self.neg_save_dir
+                index = self.neg_save_idx
+                self.neg_save_idx += 1
+            files.append((f'{save_dir}/activation-{index:04d}.wav', audio, correct_activation, index, save_dir))
+        self._save_indexes()
+        for path, audio, correct_activation, index, save_dir in files:
+            try:
+                wake.audio_collection.utils.save_wav_file(
+                    path,
+                    self.sample_size,
+                    self.sample_rate,
+                    audio)
+            except Exception as e:
+                print(f'Error saving activation {path}: {e}')
+                continue
+            print(
+                f'Saved {correct_activation} activation {index} to {save_dir}')
+        METRICS.record('activations.save', time.perf_counter() - start)
+
+    def _load_indexes(self) -> tuple[int, int]:
+        """Returns the next true and false activation indexes, from the index
+        file or (the first time) the files already saved.
+        """
+        try:
+            with open(self.index_path) as f:
+                indexes = json.load(f)
+            return int(indexes['true']), int(indexes['false'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return (wake.audio_collection.get_greatest_index(self.pos_save_dir) + 1,
+                    wake.audio_collection.get_greatest_index(self.neg_save_dir) + 1)
+
+    def _save_indexes(self) -> None:
+        """Writes the next indexes to the index file, replacing it atomically."""
+        temp_path = self.index_path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'true': self.pos_save_idx, 'false': self.neg_save_idx}, f)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f'Error saving activation indexes: {e}')
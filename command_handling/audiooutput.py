@@ -0,0 +1,145 @@
+"""Plays speech and sound effects on a background thread, so nothing waits for audio to finish."""
+import io
+import queue
+import threading
+import time
+
+from wake.metrics import METRICS
+from .lazycomponent import LazyComponent
+
+POLL_T = 0.02  # Seconds between checks if the current audio finished (sleeping, not spinning)
+LISTENING_EFFECT = 'listening'
+# Sound effects loaded into memory when the player starts
+SOUND_EFFECTS = {LISTENING_EFFECT: './notification.mp3'}
+
+
+class PlaybackHandle:
+    """Tracks queued audio, so it can be waited for or cancelled."""
+
+    def __init__(self, data: bytes, file_type: str):
+        self.data = data
+        self.file_type = file_type
+        self.submitted = time.perf_counter()
+        self.cancelled = False
+        self.done = threading.Event()  # Set once the audio finished, was cancelled or failed
+
+    def wait(self, timeout: float = None) -> bool:
+        """Waits for the audio to finish playing. Returns True if it has."""
+        return self.done.wait(timeout)
+
+    def cancel(self) -> None:
+        """Stops the audio, or skips it if it hasn't started."""
+        self.cancelled = True
+
+
+class Player:
+    """Queue of audio played one after another by a background thread.
+
+    Speech is queued and played through `mixer.music` in order, and callers get
+    a `PlaybackHandle` to wait on instead of spinning on `get_busy`. Sound
+    effects are decoded into memory once and play immediately on their own
+    channel, over any speech.
+    """
+    effects: dict  # The preloaded sound effects (`mixer.Sound`) by name
+
+    def __init__(self, mixer, effects: dict[str, str] = None):
+        """
+        Args:
+            mixer: the initialized `pygame.mixer` module
+            effects: paths of the sound effects to preload by name
+        """
+        self._mixer = mixer
+        self.effects = {}
+        for name, path in (effects if effects is not None else SOUND_EFFECTS).items():
+            try:
+                self.effects[name] = mixer.Sound(path)
+            except Exception as e:
+                print(f'Could not load sound effect {path}: {e}')
+        self._queue = queue.Queue()
+        self._current: PlaybackHandle = None
+        self._wake = threading.Event()  # Interrupts waiting for the current audio to finish
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def play(self, data: bytes, file_type: str = 'mp3') -> PlaybackHandle:
+        """Queues the audio to play after anything already queued.
+        Args:
+            data: the encoded audio
+            file_type: the audio's format (a file extension)
+        Returns:
+            handle to wait for or cancel the audio
+        """
+        handle = PlaybackHandle(data, file_type)
+        self._queue.put(handle)
+        METRICS.set_gauge('playback.queued', self._queue.qsize())
+        return handle
+
+    def play_effect(self, name: str) -> None:
+        """Plays the preloaded sound effect immediately."""
+        effect = self.effects.get(name)
+        if effect is None:
+            return
+        start = time.perf_counter()
+        effect.play()
+        METRICS.record('playback.effect_start', time.perf_counter() - start)
+
+    def stop_all(self) -> None:
+        """Stops the current audio and skips everything queued."""
+        while True:
+            try:
+                handle = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            handle.cancel()
+            handle.done.set()
+        current = self._current
+        if current is not None:
+            current.cancel()
+            self._wake.set()
+
+    def quit(self) -> None:
+        """Stops playing and closes the mixer."""
+        self.stop_all()
+        self._queue.put(None)
+        self._thread.join()
+        self._mixer.quit()
+
+    def _run(self) -> None:
+        music = self._mixer.music
+        while True:
+            handle = self._queue.get()
+            if handle is None:
+                return
+            if handle.cancelled:
+                handle.done.set()
+                continue
+            self._current = handle
+            started = time.perf_counter()
+            # Time spent behind earlier audio, then time to load and start this audio
+            METRICS.record('playback.queue_wait', started - handle.submitted)
+            try:
+                music.load(io.BytesIO(handle.data), handle.file_type)
+                music.play()
+                METRICS.record('playback.start', time.perf_counter() - started)
+                while music.get_busy() and not handle.cancelled:
+                    self._wake.wait(POLL_T)
+                    self._wake.clear()
+                if handle.cancelled:
+                    music.stop()
+                    METRICS.increment('playback.cancelled')
+                music.unload()
+            except Exception as e:
+                print(f'Error playing audio: {e}')
+            finally:
+                self._current = None
+                handle.done.set()
+                METRICS.set_gauge('playback.queued', self._queue.qsize())
+
+
+def _create_player(mixer) -> Player:
+    mixer.init()
+    return Player(mixer)
+
+
+# Shared by everything that plays audio, so the mixer is only initialized once
+PLAYER = LazyComponent('player', 'pygame.mixer', _create_player)
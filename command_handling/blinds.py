@@ -1,5 +1,11 @@
+import queue
+import select
 import socket
 import struct
+import threading
+import time
+
+from wake.metrics import METRICS
 
 TCP_IP = '10.0.0.228'  # IP address of the ESP32
 TCP_PORT = 10000  # Same port as the ESP32
@@ -7,39 +13,244 @@ TCP_PORT = 10000  # Same port as the ESP32
 OPEN_KEYWORDS = ['open', 'raise']
 CLOSE_KEYWORDS = ['close', 'lower']
 
+OPEN_RESPONSE = 'Opening blinds'
+CLOSE_RESPONSE = 'Closing blinds'
+UNKNOWN_RESPONSE = 'Unknown blinds command'
+FAILED_RESPONSE = 'I couldn\'t reach the blinds'
+
+SEND_DEADLINE_T = 5  # Seconds a command can wait to be delivered (e.g. while reconnecting) before it's dropped
+# Whether the ESP32 echoes each value back once it's received it. The current firmware only
+# reads the value, turn this on once it echoes
+ACK = False
+ACK_TIMEOUT_T = 1  # Seconds to wait for the echo before sending the value again on a new connection
+CONNECT_TIMEOUT_T = 2  # Seconds to wait for the ESP32 to accept a connection
+RECONNECT_MIN_T = 0.5  # Seconds before reconnecting after a failed connection (doubles after each failure)
+RECONNECT_MAX_T = 30  # Longest wait between reconnection attempts
+IDLE_CHECK_T = 1  # Seconds between checks that an idle connection is still open
+KEEPALIVE_IDLE_T = 10  # Seconds an idle connection waits before sending TCP keepalive probes
+KEEPALIVE_INTERVAL_T = 5  # Seconds between keepalive probes
+KEEPALIVE_PROBES = 3  # Unanswered probes before the connection counts as dead
+
+
+class BlindsCommand:
+    """Tracks a value queued for the blinds, so it can be waited for."""
+    latency: float  # Seconds from queueing the value until it was delivered, None until it's delivered
+    rtt: float  # Seconds from writing the value until the ESP32 echoed it, None without acknowledgements
+    error: Exception  # Why the value wasn't delivered, None if it was
+
+    def __init__(self, value: int, deadline_t: float):
+        self.value = value
+        self.submitted = time.perf_counter()
+        self.deadline = self.submitted + deadline_t
+        self.latency = None
+        self.rtt = None
+        self.error = None
+        self.done = threading.Event()  # Set once the value was delivered or dropped
+
+    @property
+    def sent(self) -> bool:
+        return self.done.is_set() and self.error is None
+
+    def wait(self, timeout: float = None) -> bool:
+        """Waits for the value to be delivered or dropped. Returns True if it was delivered."""
+        self.done.wait(timeout)
+        return self.sent
+
+
+class BlindsConnection:
+    """Persistent connection to the ESP32 controlling the blinds.
+
+    A background thread keeps one TCP connection open (with keepalive), so
+    commands don't wait for a new connection, and reconnects with exponential
+    backoff if the ESP32 is unreachable or closes the connection. `send`
+    queues a value and returns right away; values that can't be delivered
+    before their deadline are dropped rather than moving the blinds much later.
+
+    A successful `sendall` only means the value reached the local socket
+    buffer, so a value written just as the ESP32 closed the connection (or
+    lost power) would be lost without an error. With acknowledgements the
+    ESP32 echoes each value back, and a value that isn't echoed within
+    `ACK_TIMEOUT_T` is sent again on a new connection. Without them a value
+    counts as delivered once it's written.
+    """
+    connected: bool  # Whether there's an open connection to the ESP32
+
+    def __init__(self, address: tuple[str, int] = (TCP_IP, TCP_PORT), deadline_t: float = SEND_DEADLINE_T,
+                 ack: bool = ACK):
+        """
+        Args:
+            address: the (IP, port) of the ESP32
+            deadline_t: seconds a command can wait to be delivered before it's dropped
+            ack: whether the ESP32 echoes each value back once it's received it
+        """
+        self.address = address
+        self.deadline_t = deadline_t
+        self.ack = ack
+        self._sock: socket.socket = None
+        self._queue = queue.Queue()
+        self._retry_t = RECONNECT_MIN_T
+        self._next_connect = 0  # time.monotonic() of the next connection attempt
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def send(self, value: int) -> BlindsCommand:
+        """Queues the value to send to the blinds.
+        Args:
+            value: the value to send
+        Returns:
+            handle to wait for the value to be delivered
+        """
+        command = BlindsCommand(value, self.deadline_t)
+        self._queue.put(command)
+        return command
+
+    def close(self) -> None:
+        """Stops the background thread and closes the connection."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            if self._sock is None and time.monotonic() >= self._next_connect:
+                self._connect(CONNECT_TIMEOUT_T)
+            try:
+                command = self._queue.get(timeout=IDLE_CHECK_T)
+            except queue.Empty:
+                self._check_open()
+                continue
+            if command is None:
+                self._disconnect()
+                return
+            self._send(command)
+
+    def _send(self, command: BlindsCommand) -> None:
+        data = bytearray(struct.pack("b", command.value))
+        while True:
+            remaining = command.deadline - time.perf_counter()
+            if remaining <= 0:
+                command.error = TimeoutError(f'Could not reach the blinds within {self.deadline_t} s')
+                METRICS.increment('blinds.dropped')
+                print(f'Error sending value: {command.error}')
+                break
+            self._check_open()
+            if self._sock is None:
+                wait_t = self._next_connect - time.monotonic()
+                if wait_t > 0:
+                    time.sleep(min(wait_t, remaining))
+                    continue
+                if not self._connect(min(CONNECT_TIMEOUT_T, remaining)):
+                    continue
+            try:
+                self._sock.settimeout(remaining)
+                written = time.perf_counter()
+                self._sock.sendall(data)
+                if self.ack:
+                    self._sock.settimeout(min(ACK_TIMEOUT_T, remaining))
+                    reply = self._sock.recv(len(data))
+                    if reply != data:
+                        raise ConnectionError(f'Expected {bytes(data)!r} back, got {reply!r}' if reply
+                                              else 'Connection closed before the value was acknowledged')
+                    command.rtt = time.perf_counter() - written
+                    METRICS.record('blinds.rtt', command.rtt)
+            except OSError as e:  # Including timeouts waiting for the echo
+                print(f'Error sending value, sending it again on a new connection: {e}')
+                METRICS.increment('blinds.send_failures')
+                self._disconnect()
+                continue
+            command.latency = time.perf_counter() - command.submitted
+            # With acknowledgements, until the ESP32 had it, otherwise until it was written locally
+            METRICS.record('blinds.delivered' if self.ack else 'blinds.written', command.latency)
+            break
+        command.done.set()
+
+    def _connect(self, timeout: float) -> bool:
+        """Opens the connection. Returns True if it connected."""
+        start = time.perf_counter()
+        try:
+            sock = socket.create_connection(self.address, timeout=timeout)
+        except OSError as e:
+            METRICS.increment('blinds.connect_failures')
+            if self._retry_t == RECONNECT_MIN_T:  # Only the first failure in a row
+                print(f'Could not connect to the blinds at {self.address[0]}:{self.address[1]}, '
+                      f'retrying in the background: {e}')
+            self._next_connect = time.monotonic() + self._retry_t
+            self._retry_t = min(self._retry_t * 2, RECONNECT_MAX_T)
+            return False
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Detect a dead ESP32 (e.g. lost power) on an idle connection, where supported
+        for option, value in [('TCP_KEEPIDLE', KEEPALIVE_IDLE_T), ('TCP_KEEPINTVL', KEEPALIVE_INTERVAL_T),
+                              ('TCP_KEEPCNT', KEEPALIVE_PROBES)]:
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+        METRICS.record('blinds.connect', time.perf_counter() - start)
+        if self._retry_t != RECONNECT_MIN_T:
+            print('Reconnected to the blinds')
+        self._retry_t = RECONNECT_MIN_T
+        self._sock = sock
+        return True
+
+    def _check_open(self) -> None:
+        """Closes the connection if the ESP32 closed its end (or it failed)."""
+        if self._sock is None:
+            return
+        try:
+            readable, _, _ = select.select([self._sock], [], [], 0)
+            # Every echo was already read, so readable means it closed the connection
+            if readable and not self._sock.recv(64):
+                self._disconnect()
+        except OSError:
+            self._disconnect()
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
 
 class Blinds:
     """Class that handles the smart blinds."""
+    RESPONSES = [OPEN_RESPONSE, CLOSE_RESPONSE, UNKNOWN_RESPONSE, FAILED_RESPONSE]  # Everything `handle` can reply
 
-    @staticmethod
-    def handle(command_text: str) -> str:
-        """Handles the smart blinds.
+    def __init__(self, address: tuple[str, int] = (TCP_IP, TCP_PORT), ack: bool = ACK):
+        """
+        Args:
+            address: the (IP, port) of the ESP32
+            ack: whether the ESP32 echoes each value back once it's received it
+        """
+        self.connection = BlindsConnection(address, ack=ack)
+
+    def handle(self, command_text: str) -> str:
+        """Handles the smart blinds, waiting (up to the send deadline) for the value to be delivered.
         Args:
             command_text: the command text
         Returns:
             the output of the command
         """
         if any(keyword in command_text for keyword in OPEN_KEYWORDS):
-            Blinds.send_value(1)
-            return 'Opening blinds'
+            value, response = 1, OPEN_RESPONSE
         elif any(keyword in command_text for keyword in CLOSE_KEYWORDS):
-            Blinds.send_value(0)
-            return 'Closing blinds'
+            value, response = 0, CLOSE_RESPONSE
         else:
-            return 'Unknown blinds command'
+            return UNKNOWN_RESPONSE
+        command = self.send_value(value)
+        # The connection delivers or drops the value by its deadline, the extra second is a margin
+        if not command.wait(self.connection.deadline_t + 1):
+            return FAILED_RESPONSE
+        return response
 
-    @staticmethod
-    def send_value(value: int) -> None:
-        """Sends the given value to the blinds.
+    def send_value(self, value: int) -> BlindsCommand:
+        """Sends the given value to the blinds, without waiting for it to be delivered.
         Args:
             value: the value to send
+        Returns:
+            handle to wait for the value to be delivered
         """
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((TCP_IP, TCP_PORT))
-        try:
-            ba = bytearray(struct.pack("b", value))
-            s.send(ba)
-        except:
-            print("Error sending value")
-        finally:
-            s.close()
+        return self.connection.send(value)
@@ -0,0 +1,135 @@
+"""Runs command handlers in the background, so the wake word is still heard while they work."""
+import concurrent.futures
+import threading
+import time
+from typing import Callable
+
+from wake.metrics import METRICS
+
+MAX_WORKERS = 4  # Commands handled at the same time (a handler that missed its deadline keeps its worker)
+DEFAULT_DEADLINE_T = 10  # Seconds a handler has to reply, if its intent doesn't set a deadline
+
+
+class CommandTask:
+    """Tracks a command being handled, so it can be waited for or cancelled.
+
+    Cancelling can't interrupt the handler itself, so it stops the task's
+    speech and anything the handler would still say.
+    """
+    name: str  # Name of the command's intent
+    cancelled: bool  # Whether the task was cancelled (or missed its deadline)
+    timed_out: bool  # Whether the handler missed its deadline
+    error: Exception  # What the handler raised, None if it didn't
+
+    def __init__(self, name: str, deadline_t: float):
+        self.name = name
+        self.deadline_t = deadline_t
+        self.submitted = time.perf_counter()
+        self.cancelled = False
+        self.timed_out = False
+        self.error = None
+        self.done = threading.Event()  # Set once the handler returned
+        self._playbacks = []
+        self._lock = threading.Lock()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Waits for the handler to return. Returns True if it has."""
+        return self.done.wait(timeout)
+
+    def add_playback(self, handle) -> None:
+        """Keeps the handle of the task's speech, so cancelling the task stops it."""
+        with self._lock:
+            if not self._playbacks:
+                METRICS.record('command.reply', time.perf_counter() - self.submitted)
+            self._playbacks.append(handle)
+            if self.cancelled:
+                handle.cancel()
+
+    def cancel(self) -> None:
+        """Stops the task's speech, and any speech it would still start."""
+        with self._lock:
+            self.cancelled = True
+            for handle in self._playbacks:
+                handle.cancel()
+
+
+class CommandExecutor:
+    """Thread pool that runs command handlers with deadlines.
+
+    A handler that runs past its deadline is cancelled (see `CommandTask`),
+    and `cancel_all` cancels everything in progress, e.g. when the user
+    interrupts with the wake word. Handlers can get their own task from
+    `current_task`.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, default_deadline_t: float = DEFAULT_DEADLINE_T):
+        """
+        Args:
+            max_workers: commands handled at the same time
+            default_deadline_t: seconds a handler has to reply if none is given
+        """
+        self.default_deadline_t = default_deadline_t
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='command')
+        self._tasks: set[CommandTask] = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def current_task(self) -> CommandTask:
+        """The task of the handler running on this thread, None if it isn't a handler's thread."""
+        return getattr(self._local, 'task', None)
+
+    def submit(self, name: str, handler: Callable[[], None], deadline_t: float = None) -> CommandTask:
+        """Starts running the handler in the background.
+        Args:
+            name: name of the command's intent, for messages and metrics
+            handler: the function handling the command
+            deadline_t: seconds the handler has to return before it's cancelled, the default if None
+        Returns:
+            the task, to wait for or cancel it
+        """
+        task = CommandTask(name, deadline_t if deadline_t is not None else self.default_deadline_t)
+        with self._lock:
+            self._tasks.add(task)
+        timer = threading.Timer(task.deadline_t, self._expire, args=(task,))
+        timer.daemon = True
+        timer.start()
+        self._pool.submit(self._run, task, handler, timer)
+        return task
+
+    def cancel_all(self) -> int:
+        """Cancels every command in progress. Returns how many were cancelled."""
+        with self._lock:
+            tasks = [task for task in self._tasks if not task.cancelled]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            METRICS.increment('command.cancelled', len(tasks))
+        return len(tasks)
+
+    def _run(self, task: CommandTask, handler: Callable[[], None], timer: threading.Timer) -> None:
+        started = time.perf_counter()
+        METRICS.record('command.queue', started - task.submitted)
+        self._local.task = task
+        try:
+            if not task.cancelled:
+                handler()
+        except Exception as e:
+            task.error = e
+            METRICS.increment('command.errors')
+            print(f'Error handling command:\n{e}')
+        finally:
+            self._local.task = None
+            timer.cancel()
+            METRICS.record(f'command.handle.{task.name}', time.perf_counter() - started)
+            with self._lock:
+                self._tasks.discard(task)
+            task.done.set()
+
+    def _expire(self, task: CommandTask) -> None:
+        if task.done.is_set():
+            return
+        task.timed_out = True
+        task.cancel()
+        METRICS.increment('command.deadline_exceeded')
+        print(f'The {task.name} command missed its {task.deadline_t} s deadline, cancelling it')
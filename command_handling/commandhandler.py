@@ -1,25 +1,48 @@
 import datetime
+from typing import Callable
+from wake.metrics import METRICS
 from .activationsaver import ActivationSaver
-from .texttospeech import TextToSpeech
-from .weather import Weather
-from .blinds import Blinds
+from .audiooutput import PLAYER
+from .blinds import Blinds, SEND_DEADLINE_T, TCP_IP, TCP_PORT
+from .commandexecutor import CommandExecutor, CommandTask
+from .intentrouter import IntentRouter
+from .lazycomponent import LazyComponent
+from .lights import Lights, create_tuya_device
 
 
 class Keywords:
-    stop: set = {'stop', 'quit', 'exit', 'terminate', 'end', 'finish', 'done'}
+    stop: set = {'stop', 'cancel', 'never mind'}
+    quit: set = {'quit', 'exit', 'terminate', 'end', 'finish', 'done'}
     false_activation: set = {f'false {w}' for w in ['wake', 'activation', 'trigger']}
     weather: set = {'weather', 'temperature'}
     blinds: set = {'blinds', 'blind', 'window', 'windows'}
+    lights: set = {'light', 'lights', 'lamp'}
+    date: set = {'date'}
+    time: set = {'time'}
+
+
+# Replies that are always the same, rendered to speech ahead of time
+STATIC_RESPONSES = Blinds.RESPONSES + Lights.RESPONSES
 
 
 class CommandHandler:
-    def __init__(self, wake_listener, sample_size: int, sample_rate: int, is_pi: bool, save_activations: bool):
+    def __init__(self, wake_listener, sample_size: int, sample_rate: int, save_activations: bool,
+                 blinds_address: tuple[str, int] = (TCP_IP, TCP_PORT),
+                 light_device_factory: Callable = create_tuya_device):
         """
         Creates a new CommandHandler.
         Args:
             wake_listener: the wake listener to use (`wake.WakeListener` instance)
             sample_size: the sample size (Bytes) of the audio
             sample_rate: the sample rate (Hz) of the audio
+            blinds_address: the (IP, port) of the blinds' ESP32
+            light_device_factory: creates the lights' sessions (see `Lights`)
+
+        Text to speech, the weather and the lights are slow to import and create, so they're
+        created on first use, or ahead of time by `start_background_init`.
+
+        Commands are handled in the background by `executor`, each with a
+        deadline, and `cancel` (or saying stop) cancels them and stops speaking.
         """
         self.wake_listener = wake_listener
         self.save_activations = save_activations
@@ -28,36 +51,111 @@ class CommandHandler:
                                                     sample_rate=sample_rate)
         else:
             self.activation_saver = None
-        self.tts = TextToSpeech(is_pi)
-        self.weather = Weather()
-
-    def handle(self, command_text: str) -> None:
-        """Handles the given command text."""
-        if self._keywords_in_command(command_text, Keywords.stop):
-            print('Stopping...')
-            exit(0)
-        elif self._keywords_in_command(command_text, Keywords.false_activation):
-            print('False activation detected')
-            self._save_last_activation(False)
-        elif self._keywords_in_command(command_text, Keywords.weather):
-            weather = self.weather.get_weather()
-            self.tts.speak(weather)
-        elif self._keywords_in_command(command_text, Keywords.blinds):
-            output: str = Blinds.handle(command_text)
-            self.tts.speak(output)
-        elif 'date' in command_text:
-            today = datetime.date.today()
-            readable_date = today.strftime("%B %d, %Y")
-            self.tts.speak(readable_date)
-        elif 'time' in command_text:
-            now = datetime.datetime.now()
-            readable_time = now.strftime("%I:%M %p")
-            self.tts.speak(readable_time)
-        else:
+        self.blinds = Blinds(blinds_address)
+        self._tts = LazyComponent('tts', 'command_handling.texttospeech', self._create_tts)
+        self._weather = LazyComponent('weather', 'command_handling.weather', lambda m: m.Weather())
+        self._lights = LazyComponent('lights', 'command_handling.lights',
+                                     lambda m: m.Lights(device_factory=light_device_factory))
+        self.components = [PLAYER, self._tts, self._weather, self._lights]
+        self.executor = CommandExecutor()
+        # Higher priorities win when a command matches several intents
+        self.router = IntentRouter()
+        self.router.add('quit', self._quit, Keywords.quit, priority=110, save_activation=False, background=False)
+        self.router.add('stop', lambda text: self.cancel(), Keywords.stop, priority=100, background=False)
+        self.router.add('false_activation', self._false_activation, Keywords.false_activation, priority=90,
+                        save_activation=False, background=False)
+        self.router.add('weather', self._speak_weather, Keywords.weather, priority=50, deadline_t=8)
+        self.router.add('blinds', lambda text: self._speak(self.blinds.handle(text)), Keywords.blinds,
+                        priority=40, deadline_t=SEND_DEADLINE_T + 2)
+        self.router.add('lights', lambda text: self._speak(self.lights.handle(text)), Keywords.lights,
+                        priority=30, deadline_t=8)
+        self.router.add('date', self._speak_date, Keywords.date, priority=20, deadline_t=5)
+        self.router.add('time', self._speak_time, Keywords.time, priority=10, deadline_t=5)
+
+    @property
+    def tts(self):
+        """The `TextToSpeech`, created if needed."""
+        return self._tts.get()
+
+    @property
+    def weather(self):
+        """The `Weather`, created if needed (starts updating the forecast in the background)."""
+        return self._weather.get()
+
+    @property
+    def lights(self):
+        """The `Lights`, created if needed (connects to the lights in the background)."""
+        return self._lights.get()
+
+    @staticmethod
+    def _create_tts(module):
+        tts = module.TextToSpeech()
+        # Fixed replies play instantly once they're cached
+        tts.prerender(STATIC_RESPONSES)
+        return tts
+
+    def start_background_init(self) -> None:
+        """Starts creating the slow components in the background, so they're ready for the first command."""
+        for component in self.components:
+            component.start()
+
+    def handle(self, command_text: str) -> CommandTask:
+        """Starts handling the given command text.
+        Returns:
+            the task handling the command in the background, None if it was handled right away or not understood
+        """
+        with METRICS.time('command.route'):
+            match = self.router.route(command_text)
+        if match is None:
             print('Unknown command')
-            return
+            return None
+        intent = match.intent
         # If it understood the command, save as a true activation
-        self._save_last_activation(True)
+        if intent.save_activation:
+            self._save_last_activation(True)
+        if not intent.background:
+            intent.handler(command_text)
+            return None
+        return self.executor.submit(intent.name, lambda: intent.handler(command_text), intent.deadline_t)
+
+    def cancel(self) -> None:
+        """Cancels the commands being handled and stops speaking."""
+        self.executor.cancel_all()
+        if PLAYER.ready:
+            PLAYER.get().stop_all()
+
+    def _speak(self, text: str) -> None:
+        """Speaks the reply of the command being handled on this thread, unless it was cancelled."""
+        task = self.executor.current_task
+        if task is not None and task.cancelled:
+            return
+        handle = self.tts.speak(text)
+        if task is not None and handle is not None:
+            task.add_playback(handle)
+
+    def _quit(self, command_text: str) -> None:
+        print('Stopping...')
+        if self.activation_saver is not None:
+            self.activation_saver.close()  # Finish writing the saved activations
+        exit(0)
+
+    def _false_activation(self, command_text: str) -> None:
+        print('False activation detected')
+        self._save_last_activation(False)
+
+    def _speak_weather(self, command_text: str) -> None:
+        weather = self.weather.get_weather()
+        self._speak(weather)
+
+    def _speak_date(self, command_text: str) -> None:
+        today = datetime.date.today()
+        readable_date = today.strftime("%B %d, %Y")
+        self._speak(readable_date)
+
+    def _speak_time(self, command_text: str) -> None:
+        now = datetime.datetime.now()
+        readable_time = now.strftime("%I:%M %p")
+        self._speak(readable_time)
 
     def _save_last_activation(self, correct_activation: bool):
         """
@@ -69,15 +167,3 @@ class CommandHandler:
             return
         activation_audio = self.wake_listener.last_activation_audio()
         self.activation_saver.save(activation_audio, correct_activation)
-
-    @staticmethod
-    def _keywords_in_command(text: str, keywords: set) -> bool:
-        """
-        Checks whether the text contains any of the keywords.
-        Args:
-            text: the text to check
-            keywords: the keywords to check for
-        Returns:
-            True if the text contains any of the keywords, False otherwise
-        """
-        return any([w in text for w in keywords])
@@ -1,34 +1,58 @@
 import audioop
-from pygame import mixer
+import time
+from collections import deque
+from wake.metrics import METRICS
 from wake.parameters import DEFAULT_AUDIO_PARAMS as AP
+from .audiooutput import LISTENING_EFFECT, PLAYER
+from .endpointer import Endpointer
 
-VOL_THRESH = 200  # minimum volume to start listening
+VOL_THRESH = 200  # minimum volume to start listening (fixed threshold mode)
 
-END_QUIET_T = 1.0  # allowed silence while continuing to listen in seconds
+END_QUIET_T = 1.0  # allowed silence while continuing to listen in seconds (fixed threshold mode)
 END_QUIET_FRAMES = int(END_QUIET_T * AP.chunks_per_sec)
 
+HANGOVER_T = 0.35  # silence after speech that ends the command in seconds (adaptive mode)
+HANGOVER_FRAMES = round(HANGOVER_T * AP.chunks_per_sec)
+
+START_SPEECH_FRAMES = 2  # consecutive speech chunks that start the command (adaptive mode)
+PRE_ROLL_FRAMES = 3  # chunks kept from before the command started, so its start isn't cut off
+
 BEG_QUIET_T = 5  # allowed silence while waiting for command in seconds
 BEG_QUIET_FRAMES = int(BEG_QUIET_T * AP.chunks_per_sec)
 
 MAX_COMMAND_T = 10  # how long the command can be in seconds
 MAX_COMMAND_FRAMES = int(MAX_COMMAND_T * AP.chunks_per_sec)
 
-# Path to the sound to play when listening
-WAKE_AUDIO_PATH = "./notification.mp3"
-
 
 class CommandListener:
     """Class that listens for a command after the wake word is detected."""
 
-    def __init__(self):
-        mixer.init()
+    def __init__(self, adaptive: bool = True):
+        """
+        Args:
+            adaptive: if True, detects speech relative to the background noise
+                and ends the command shortly after speech stops. Otherwise uses
+                a fixed volume threshold and waits `END_QUIET_T` seconds.
+        """
+        self.adaptive = adaptive
+        self.endpointer = Endpointer(AP) if adaptive else None
+        self.start_frames = START_SPEECH_FRAMES if adaptive else 1
+        self.end_frames = HANGOVER_FRAMES if adaptive else END_QUIET_FRAMES
         self.beg_waiting_frames = 0
+        self.speech_frames = 0
         self.quiet_frames = 0
         self.audio_buffer = []
+        self._pre_roll = deque(maxlen=PRE_ROLL_FRAMES + START_SPEECH_FRAMES)
         self.listening = False
-        print(f"ALLOWED_QUIET_FRAMES = {END_QUIET_FRAMES}")
+        self.last_speech_t = None  # time.perf_counter() when the last speech chunk of the command was heard
+        print(f"ALLOWED_QUIET_FRAMES = {self.end_frames}")
         print(f"MAX_COMMAND_FRAMES = {MAX_COMMAND_FRAMES}")
 
+    def observe(self, data: bytes) -> None:
+        """Keeps track of the background noise while not listening for a command."""
+        if self.endpointer is not None:
+            self.endpointer.observe(data)
+
     def listen(self, data: bytes) -> bool:
         """
         Records the incoming audio and returns True when the command is complete.
@@ -37,47 +61,67 @@ class CommandListener:
         Returns:
             True when the command is complete, False if still listening
         """
-        volume = audioop.max(data, 2)
+        if self.adaptive:
+            is_speech = self.endpointer.is_speech(data)
+        else:
+            is_speech = audioop.max(data, 2) > VOL_THRESH
 
         # Handle before heard anything
         if not self.listening:
-            if volume > VOL_THRESH:
-                # Start listening if volume is above threshold
+            self._pre_roll.append(data)
+            self.speech_frames = self.speech_frames + 1 if is_speech else 0
+            if self.speech_frames >= self.start_frames:
+                # Start listening once speech is heard, including the audio just before it
                 self.listening = True
+                self.last_speech_t = time.perf_counter()
+                self.audio_buffer.extend(self._pre_roll)
+                self._pre_roll.clear()
+                return False
             elif self.beg_waiting_frames == 0:
                 # Play sound the first time this is called
                 print('Waiting to hear a command...')
                 self._play_listening_sound()
             elif self.beg_waiting_frames > BEG_QUIET_FRAMES:
-                self.beg_waiting_frames = 0
+                self._reset()
                 return True  # Done listening
             self.beg_waiting_frames += 1
-
-        if self.listening:
-            self.audio_buffer.append(data)
-            print(f"volume: {volume:<20}",
-                  f"quiet frames: {self.quiet_frames:>5}/{END_QUIET_FRAMES}", end='\r')
-            if volume < VOL_THRESH:
-                self.quiet_frames += 1
-            else:
-                self.quiet_frames = 0
-
-            if self.quiet_frames > END_QUIET_FRAMES:
-                self.quiet_frames = 0
-                self.listening = False
-                if len(self.audio_buffer) > 0:
-                    return True
-
-            if len(self.audio_buffer) > MAX_COMMAND_FRAMES:
-                self.listening = False
-                return True
+            return False
+
+        self.audio_buffer.append(data)
+        if is_speech:
+            self.quiet_frames = 0
+            self.last_speech_t = time.perf_counter()
+        else:
+            self.quiet_frames += 1
+        METRICS.status.update(lambda: f"speech: {is_speech!s:<6} "
+                                      f"quiet frames: {self.quiet_frames:>5}/{self.end_frames}")
+
+        if self.quiet_frames >= self.end_frames:
+            self.listening = False
+            return True
+
+        if len(self.audio_buffer) > MAX_COMMAND_FRAMES:
+            METRICS.increment('command.max_length')
+            self.listening = False
+            return True
 
         return False
 
     def _play_listening_sound(self):
         """Plays a sound to indicate that the command listener is listening."""
-        mixer.music.load(WAKE_AUDIO_PATH)
-        mixer.music.play()
+        try:
+            PLAYER.get().play_effect(LISTENING_EFFECT)
+        except Exception as e:
+            # Keep listening without the cue rather than stopping the main loop
+            print(f'Could not play the listening sound: {e}')
+
+    def _reset(self):
+        """Gets ready for the next command."""
+        self.quiet_frames = 0
+        self.speech_frames = 0
+        self.beg_waiting_frames = 0
+        self.listening = False
+        self._pre_roll.clear()
 
     def get_audio(self) -> bytes:
         """
@@ -87,9 +131,9 @@ class CommandListener:
         """
         if len(self.audio_buffer) == 0:
             print('No audio to return')
+            self._reset()
             return None
         audio = b''.join(self.audio_buffer)
         self.audio_buffer = []
-        self.quiet_frames = 0
-        self.beg_waiting_frames = 0
+        self._reset()
         return audio
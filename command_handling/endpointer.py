@@ -0,0 +1,72 @@
+from collections import deque
+import numpy as np
+
+from wake.parameters import AudioParams, DEFAULT_AUDIO_PARAMS
+
+MIN_SPEECH_RMS = 100  # Chunks with a lower RMS volume (at speech frequencies) are never speech
+SPEECH_SNR = 3.0  # How many times louder than the noise floor speech has to be
+SPEECH_BAND_HZ = (100, 4000)  # Frequencies most of the energy of speech is in
+SPEECH_BAND_RATIO = 0.5  # Fraction of a speech chunk's energy that has to be in the speech band
+NOISE_WINDOW_T = 3.0  # Seconds of audio the noise floor is the quietest chunk of
+INITIAL_NOISE_FLOOR = MIN_SPEECH_RMS / SPEECH_SNR  # Noise floor before any audio is seen
+
+
+class Endpointer:
+    """Voice activity detection that adapts to the room's background noise.
+
+    Volumes are measured only at speech frequencies, so low hums and rumbles
+    don't mask speech. The noise floor is the volume of the quietest chunk in
+    the last few seconds, since even continuous speech has short pauses, so
+    fans and other steady noise raise the floor within a few seconds and stop
+    counting as speech. A chunk is speech if it's clearly louder than the
+    floor and most of its energy is at speech frequencies.
+    """
+
+    def __init__(self, ap: AudioParams = DEFAULT_AUDIO_PARAMS):
+        """
+        Args:
+            ap: the audio parameters
+        """
+        self._recent_levels = deque([INITIAL_NOISE_FLOOR], maxlen=max(1, int(NOISE_WINDOW_T * ap.chunks_per_sec)))
+        self._n_fft = ap.chunk_size
+        frequencies = np.fft.rfftfreq(self._n_fft, 1 / ap.sample_rate)
+        self._speech_band = (frequencies >= SPEECH_BAND_HZ[0]) & (frequencies <= SPEECH_BAND_HZ[1])
+
+    @property
+    def noise_floor(self) -> float:
+        """The estimated RMS volume of the background noise at speech frequencies."""
+        return min(self._recent_levels)
+
+    @property
+    def speech_threshold(self) -> float:
+        """The RMS volume at speech frequencies a chunk needs to be speech."""
+        return max(MIN_SPEECH_RMS, self.noise_floor * SPEECH_SNR)
+
+    def observe(self, data: bytes) -> float:
+        """Updates the noise floor with a chunk of audio.
+        Returns:
+            the RMS volume of the chunk's speech frequencies
+        """
+        level, _ = self._levels(data)
+        self._recent_levels.append(level)
+        return level
+
+    def is_speech(self, data: bytes) -> bool:
+        """Updates the noise floor and checks if the chunk of audio is speech."""
+        threshold = self.speech_threshold  # Before this chunk can lower it
+        level, band_ratio = self._levels(data)
+        self._recent_levels.append(level)
+        return level >= threshold and band_ratio >= SPEECH_BAND_RATIO
+
+    def _levels(self, data: bytes) -> tuple[float, float]:
+        """Returns the RMS volume of the chunk's speech frequencies, and the
+        fraction of the chunk's energy at speech frequencies.
+        """
+        samples = np.frombuffer(data, dtype='<i2').astype(np.float32)
+        power = np.abs(np.fft.rfft(samples, n=self._n_fft)) ** 2
+        total = power.sum()
+        if total == 0:
+            return 0.0, 0.0
+        band = power[self._speech_band].sum()
+        # Parseval's theorem (the one sided spectrum counts most bins twice)
+        return float(np.sqrt(2 * band) / self._n_fft), float(band / total)
@@ -0,0 +1,98 @@
+"""Local stand-in for the blinds' ESP32, to try the blinds commands without the hardware.
+
+Run `python -m command_handling.fakeblinds` and point the assistant at it with
+`python text_commands.py --blinds 127.0.0.1:10000`.
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+
+from .blinds import TCP_PORT
+
+
+class FakeBlinds:
+    """TCP server that accepts values the way the ESP32 does and records them (optionally echoing them back)."""
+    values: list  # (time.perf_counter(), value) of every value received
+    connections: int  # Number of connections accepted
+
+    def __init__(self, host: str = '127.0.0.1', port: int = TCP_PORT, close_after_value: bool = False,
+                 accept_delay_t: float = 0, ack: bool = False, verbose: bool = False):
+        """
+        Args:
+            host: the address to listen on
+            port: the port to listen on, 0 for any free port
+            close_after_value: close each connection after one value, like simple firmware does
+            accept_delay_t: seconds to wait before accepting each connection, to simulate a slow controller
+            ack: echo each value back once it's received, like firmware that acknowledges values
+            verbose: print each value received
+        """
+        self.close_after_value = close_after_value
+        self.accept_delay_t = accept_delay_t
+        self.ack = ack
+        self.verbose = verbose
+        self.values = []
+        self.connections = 0
+        self._received = threading.Condition()
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()[:2]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def wait_for_values(self, n: int, timeout: float = None) -> bool:
+        """Waits until `n` values have been received. Returns True if they have."""
+        with self._received:
+            return self._received.wait_for(lambda: len(self.values) >= n, timeout)
+
+    def close(self) -> None:
+        """Stops accepting connections."""
+        self._server.close()
+
+    def _serve(self) -> None:
+        while True:
+            if self.accept_delay_t:
+                time.sleep(self.accept_delay_t)
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        with conn:
+            while True:
+                data = conn.recv(1)
+                if not data:
+                    return
+                value = struct.unpack('b', data)[0]
+                if self.ack:
+                    try:
+                        conn.sendall(data)
+                    except OSError:
+                        return
+                with self._received:
+                    self.values.append((time.perf_counter(), value))
+                    self._received.notify_all()
+                if self.verbose:
+                    print(f'Received {value}')
+                if self.close_after_value:
+                    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs a fake blinds ESP32 on this machine')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=TCP_PORT, help='Port to listen on')
+    parser.add_argument('--close-after-value', action='store_true',
+                        help='Close each connection after one value')
+    parser.add_argument('--ack', action='store_true', help='Echo the values back (for clients with ACK on)')
+    args = parser.parse_args()
+    fake = FakeBlinds(args.host, args.port, args.close_after_value, ack=args.ack, verbose=True)
+    print(f'Fake blinds listening on {fake.address[0]}:{fake.address[1]}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.close()
@@ -0,0 +1,58 @@
+"""Local stand-in for the Tuya lights, to try the lights commands without the hardware.
+
+Run `python text_commands.py --fake-lights` to use it.
+"""
+import threading
+import time
+
+
+class FakeTuyaDevice:
+    """Behaves like a `tinytuya.OutletDevice` with a persistent connection, replying after a delay."""
+    requests: int  # Number of requests the device has handled
+    connections: int  # Number of times the device was connected to
+
+    def __init__(self, device_id: str, ip: str, local_key: str, version: float, latency_t: float = 0.2,
+                 reachable: bool = True):
+        """
+        Args:
+            device_id, ip, local_key, version: the device's settings, as for `tinytuya.OutletDevice`
+            latency_t: seconds the device takes to reply (a new connection takes twice as long)
+            reachable: if False, every request fails like an unreachable device
+        """
+        self.device_id = device_id
+        self.ip = ip
+        self.latency_t = latency_t
+        self.reachable = reachable
+        self.requests = 0
+        self.connections = 0
+        self._is_on = False
+        self._connected = False
+        self._lock = threading.Lock()
+
+    def status(self) -> dict:
+        return self._request()
+
+    def turn_on(self, switch: int = 1) -> dict:
+        return self._request(True)
+
+    def turn_off(self, switch: int = 1) -> dict:
+        return self._request(False)
+
+    def close(self) -> None:
+        self._connected = False
+
+    def _request(self, is_on: bool = None) -> dict:
+        with self._lock:
+            if not self.reachable:
+                time.sleep(self.latency_t)
+                self._connected = False
+                return {'Error': 'Network Error: Unable to Connect', 'Err': '901', 'Payload': None}
+            if not self._connected:
+                time.sleep(self.latency_t)  # Connection handshake
+                self._connected = True
+                self.connections += 1
+            time.sleep(self.latency_t)
+            self.requests += 1
+            if is_on is not None:
+                self._is_on = is_on
+            return {'devId': self.device_id, 'dps': {'1': self._is_on}}
@@ -0,0 +1,130 @@
+"""Finds the handler for a command by matching all the handlers' keywords at once."""
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits text into lowercase words, dropping punctuation."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+@dataclass
+class Intent:
+    """A handler and the keywords that select it."""
+    name: str  # Name of the intent in messages
+    handler: Callable[[str], None]  # Called with the command text
+    keywords: list[str]  # Words or phrases (several words) that select the intent
+    priority: int  # The intent with the highest priority wins when several match
+    save_activation: bool  # Whether handling it saves the activation as a true activation
+    deadline_t: float = None  # Seconds the handler has to reply, the executor's default if None
+    background: bool = True  # Whether the handler runs in the background, or right away on the caller's thread
+
+
+@dataclass
+class Match:
+    """Where an intent's keyword was found in a command."""
+    intent: Intent
+    keyword: str
+    start: int  # Index of the keyword's first word in the command
+    length: int  # Number of words in the keyword
+
+
+class IntentRouter:
+    """Registry of command handlers, matched by keyword.
+
+    Keywords are whole words or phrases, so "end" doesn't match "weekend".
+    They're compiled into one Aho-Corasick automaton over words, which finds
+    every keyword in a command in a single pass, however many intents there
+    are. If several intents match, the one with the highest priority wins,
+    then the one with the longest keyword, then the one added first. A
+    keyword can only belong to one intent, so it can't silently do nothing.
+    """
+    intents: list  # The registered `Intent`s, in the order they were added
+
+    def __init__(self):
+        self.intents = []
+        self._owners: dict[tuple, Intent] = {}  # The intent of each keyword (as words)
+        self._compiled = False
+
+    def add(self, name: str, handler: Callable[[str], None], keywords, priority: int = 0,
+            save_activation: bool = True, deadline_t: float = None, background: bool = True) -> Intent:
+        """Registers a handler.
+        Args:
+            name: name of the intent in messages
+            handler: called with the command text when the intent is selected
+            keywords: words or phrases that select the intent
+            priority: the intent with the highest priority wins when several match
+            save_activation: whether handling it saves the activation as a true activation
+            deadline_t: seconds the handler has to reply, the executor's default if None
+            background: whether the handler runs in the background (quick handlers that
+                control the assistant itself, like stopping, run right away)
+        Returns:
+            the registered intent
+        Raises:
+            ValueError: if a keyword is empty or already belongs to another intent
+        """
+        intent = Intent(name, handler, sorted(keywords), priority, save_activation, deadline_t, background)
+        for keyword in intent.keywords:
+            words = tuple(tokenize(keyword))
+            if not words:
+                raise ValueError(f'Intent {name} has a keyword without any words: "{keyword}"')
+            owner = self._owners.get(words)
+            if owner is not None:
+                raise ValueError(f'Keyword "{keyword}" of intent {name} already belongs to intent {owner.name}')
+        for keyword in intent.keywords:
+            self._owners[tuple(tokenize(keyword))] = intent
+        self.intents.append(intent)
+        self._compiled = False
+        return intent
+
+    def find(self, command_text: str) -> list[Match]:
+        """Finds every keyword in the command, in the order they end."""
+        if not self._compiled:
+            self._compile()
+        matches = []
+        state = 0
+        for i, word in enumerate(tokenize(command_text)):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for words in self._output[state]:
+                matches.append(Match(self._owners[words], ' '.join(words), i - len(words) + 1, len(words)))
+        return matches
+
+    def route(self, command_text: str) -> Match:
+        """Returns the match of the intent that should handle the command, or None if none match."""
+        matches = self.find(command_text)
+        return max(matches, default=None,
+                   key=lambda m: (m.intent.priority, m.length, -self._order[id(m.intent)], -m.start))
+
+    def _compile(self) -> None:
+        """Builds the Aho-Corasick automaton of all the keywords."""
+        self._goto: list[dict[str, int]] = [{}]  # Next state by word, for each state
+        self._output: list[list[tuple]] = [[]]  # Keywords (as words) that end at each state
+        for words in self._owners:
+            state = 0
+            for word in words:
+                if word not in self._goto[state]:
+                    self._goto.append({})
+                    self._output.append([])
+                    self._goto[state][word] = len(self._goto) - 1
+                state = self._goto[state][word]
+            self._output[state].append(words)
+        # Breadth first, so each state's failure state (longest proper suffix that's a prefix) is done first
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(word, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+        self._order = {id(intent): i for i, intent in enumerate(self.intents)}
+        self._compiled = True
@@ -0,0 +1,69 @@
+import importlib
+import threading
+import time
+from typing import Callable
+
+from wake.metrics import METRICS
+
+
+class LazyComponent:
+    """Imports and creates a slow component on first use, or ahead of time in the background.
+
+    The import and creation times are recorded as `startup.import.<name>` and
+    `startup.init.<name>` in `METRICS`. If creating the component fails it's
+    retried on the next use.
+    """
+    name: str  # Name of the component in messages and metrics
+
+    def __init__(self, name: str, module_name: str, factory: Callable):
+        """
+        Args:
+            name: name of the component in messages and metrics
+            module_name: the module to import before creating the component
+            factory: called with the imported module, returns the component
+        """
+        self.name = name
+        self._module_name = module_name
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        """True once the component has been created."""
+        return self._value is not None
+
+    def start(self) -> None:
+        """Starts creating the component on a background thread."""
+        if self._value is None and self._thread is None:
+            self._thread = threading.Thread(target=self._create_in_background, daemon=True)
+            self._thread.start()
+
+    def wait(self) -> None:
+        """Waits for the background creation (if started) to finish."""
+        if self._thread is not None:
+            self._thread.join()
+
+    def get(self):
+        """Returns the component, creating it (or waiting for the background thread) if needed."""
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._create()
+        return self._value
+
+    def _create(self):
+        start = time.perf_counter()
+        module = importlib.import_module(self._module_name)
+        imported = time.perf_counter()
+        value = self._factory(module)
+        METRICS.record(f'startup.import.{self.name}', imported - start)
+        METRICS.record(f'startup.init.{self.name}', time.perf_counter() - imported)
+        return value
+
+    def _create_in_background(self) -> None:
+        try:
+            self.get()
+        except Exception as e:
+            print(f'Could not initialize {self.name}, retrying when it\'s used: {e}')
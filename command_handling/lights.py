@@ -0,0 +1,198 @@
+"""Controls the Tuya smart lights over the local network (https://github.com/jasonacox/tinytuya)."""
+import concurrent.futures
+import threading
+import time
+from typing import Callable
+
+from wake.metrics import METRICS
+from .intentrouter import tokenize
+
+# name: (device ID, IP address, local key, protocol version) of each light
+LIGHTS = {
+    'light': ('36543161840d8e525100', '10.0.0.238', 'bb05c0afa59e3f17', 3.1),
+}
+SWITCH_DPS = '1'  # Data point of a device's on/off switch
+STATUS_TTL_T = 30  # Seconds a device's on/off status is trusted without asking it again
+DEVICE_TIMEOUT_T = 2  # Seconds to wait for a device to reply
+
+# Matched against whole words, since "on" is part of many words
+ON_KEYWORDS = ['on']
+OFF_KEYWORDS = ['off']
+# A command is a question if one of these comes before "on" or "off" ("hey, are the lights on")
+QUESTION_KEYWORDS = ['is', 'are']
+
+ON_RESPONSE = 'Turning on the lights'
+OFF_RESPONSE = 'Turning off the lights'
+ALL_ON_RESPONSE = 'The lights are on'
+ALL_OFF_RESPONSE = 'The lights are off'
+SOME_ON_RESPONSE = 'Some of the lights are on'
+FAILED_RESPONSE = 'I couldn\'t reach the lights'
+UNKNOWN_RESPONSE = 'Unknown lights command'
+
+
+def create_tuya_device(device_id: str, ip: str, local_key: str, version: float):
+    """Creates a `tinytuya.OutletDevice` that keeps its connection open between commands."""
+    import tinytuya  # Slow to import, and not needed with a stand-in
+    device = tinytuya.OutletDevice(device_id, ip, local_key)
+    device.set_version(version)
+    device.set_socketPersistent(True)
+    device.set_socketTimeout(DEVICE_TIMEOUT_T)
+    return device
+
+
+class Light:
+    """A smart light, with its last known on/off status."""
+    name: str  # Name of the light in commands
+
+    def __init__(self, name: str, device, status_ttl_t: float = STATUS_TTL_T):
+        """
+        Args:
+            name: name of the light in commands
+            device: the device's session (a `tinytuya.OutletDevice` or a stand-in)
+            status_ttl_t: seconds the on/off status is trusted without asking the device again
+        """
+        self.name = name
+        self.status_ttl_t = status_ttl_t
+        self._device = device
+        self._lock = threading.Lock()  # The device's connection handles one request at a time
+        self._is_on: bool = None
+        self._status_time = 0  # time.monotonic() of when `_is_on` was last known
+
+    def is_on(self) -> bool:
+        """Returns whether the light is on, asking the device only if the last status is too old."""
+        with self._lock:
+            if self._is_on is not None and time.monotonic() - self._status_time < self.status_ttl_t:
+                METRICS.increment('lights.status_cache_hits')
+                return self._is_on
+            with METRICS.time('lights.status'):
+                result = self._device.status()
+            self._update_status(self._check(result))
+            return self._is_on
+
+    def switch(self, on: bool) -> None:
+        """Turns the light on or off."""
+        with self._lock:
+            with METRICS.time('lights.switch'):
+                result = self._device.turn_on() if on else self._device.turn_off()
+            self._update_status(self._check(result), on)
+
+    def close(self) -> None:
+        with self._lock:
+            self._device.close()
+
+    def _check(self, result: dict) -> dict:
+        """Returns the device's reply, raising an error if it failed."""
+        if result and 'Error' in result:
+            METRICS.increment('lights.errors')
+            raise ConnectionError(f'{self.name}: {result["Error"]}')
+        return result
+
+    def _update_status(self, result: dict, expected: bool = None) -> None:
+        """Updates the cached status from the device's reply, or to the expected status if it didn't say."""
+        dps = result.get('dps', {}) if result else {}
+        is_on = dps.get(SWITCH_DPS, expected)
+        if is_on is not None:
+            self._is_on = bool(is_on)
+            self._status_time = time.monotonic()
+
+
+class Lights:
+    """Class that handles the smart lights.
+
+    Each light keeps its connection open between commands and remembers its
+    status for `STATUS_TTL_T` seconds (starting with a status check in the
+    background), so asking if the lights are on is usually answered without
+    the network. Commands for several lights are sent to them in parallel.
+    """
+    RESPONSES = [ON_RESPONSE, OFF_RESPONSE, ALL_ON_RESPONSE, ALL_OFF_RESPONSE, SOME_ON_RESPONSE,
+                 FAILED_RESPONSE, UNKNOWN_RESPONSE]  # Everything `handle` can reply
+    lights: dict  # The `Light`s by name
+
+    def __init__(self, devices: dict = None, device_factory: Callable = create_tuya_device,
+                 status_ttl_t: float = STATUS_TTL_T):
+        """
+        Args:
+            devices: (device ID, IP address, local key, protocol version) of each light by name,
+                `LIGHTS` if None
+            device_factory: called with a light's (device ID, IP address, local key, protocol version),
+                returns its session
+            status_ttl_t: seconds a light's status is trusted without asking it again
+        """
+        devices = devices if devices is not None else LIGHTS
+        self.lights = {name: Light(name, device_factory(*config), status_ttl_t) for name, config in devices.items()}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self.lights)),
+                                                               thread_name_prefix='lights')
+        for light in self.lights.values():
+            self._executor.submit(self._refresh, light)
+
+    def handle(self, command_text: str) -> str:
+        """Handles the smart lights.
+        Args:
+            command_text: the command text
+        Returns:
+            the output of the command
+        """
+        words = tokenize(command_text)
+        # Only the named lights, or all of them if none are named
+        names = [name for name in self.lights if name in words] or None
+        switch_index = next((i for i, word in enumerate(words) if word in ON_KEYWORDS + OFF_KEYWORDS), None)
+        if switch_index is not None and any(word in QUESTION_KEYWORDS for word in words[:switch_index]):
+            statuses = list(self.status(names).values())
+            if None in statuses:
+                return FAILED_RESPONSE
+            elif all(statuses):
+                return ALL_ON_RESPONSE
+            elif any(statuses):
+                return SOME_ON_RESPONSE
+            return ALL_OFF_RESPONSE
+        elif any(keyword in words for keyword in OFF_KEYWORDS):
+            errors = self.switch(False, names)
+            return FAILED_RESPONSE if any(errors.values()) else OFF_RESPONSE
+        elif any(keyword in words for keyword in ON_KEYWORDS):
+            errors = self.switch(True, names)
+            return FAILED_RESPONSE if any(errors.values()) else ON_RESPONSE
+        else:
+            return UNKNOWN_RESPONSE
+
+    def switch(self, on: bool, names: list[str] = None) -> dict:
+        """Turns the lights on or off in parallel.
+        Args:
+            on: whether to turn the lights on
+            names: the lights to switch, all of them if None
+        Returns:
+            the error switching each light by name, None for the lights that were switched
+        """
+        def switch(light):
+            try:
+                light.switch(on)
+            except Exception as e:
+                print(f'Could not switch {light.name}: {e}')
+                return e
+        return self._map(switch, names)
+
+    def status(self, names: list[str] = None) -> dict:
+        """Checks if the lights are on, in parallel.
+        Args:
+            names: the lights to check, all of them if None
+        Returns:
+            whether each light is on by name, None for the lights that couldn't be reached
+        """
+        return self._map(self._refresh, names)
+
+    def close(self) -> None:
+        """Closes the connections to the lights."""
+        self._executor.shutdown()
+        for light in self.lights.values():
+            light.close()
+
+    def _map(self, function: Callable, names: list[str] = None) -> dict:
+        lights = [self.lights[name] for name in (names if names is not None else self.lights)]
+        return dict(zip([light.name for light in lights], self._executor.map(function, lights)))
+
+    @staticmethod
+    def _refresh(light: Light) -> bool:
+        try:
+            return light.is_on()
+        except Exception as e:
+            print(f'Could not get the status of {light.name}: {e}')
+            return None
@@ -0,0 +1,202 @@
+"""Converts command audio to text on a worker thread, so listening never stops for the network."""
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from wake.metrics import METRICS
+
+STT_TIMEOUT_T = 8  # Seconds a recognition can take before its result is discarded
+MAX_PENDING = 2  # Commands that can wait for recognition before new ones are dropped
+STUB_TEXT = 'what time is it'  # Text returned by the stub recognizer by default
+
+
+class Recognizer:
+    """Interface for speech recognition engines."""
+    name: str = 'recognizer'
+
+    def load(self) -> None:
+        """Imports and sets up the engine. Called on the worker thread before the first command."""
+        pass
+
+    def recognize(self, audio: bytes, sample_rate: int, sample_size: int, timeout: float) -> str:
+        """Converts speech to text.
+        Args:
+            audio: the command audio (16 bit mono)
+            sample_rate: the sample rate (Hz) of the audio
+            sample_size: the sample size (Bytes) of the audio
+            timeout: seconds the engine should give up after (if it supports it)
+        Returns:
+            the text in lower case, or None if the speech wasn't understood
+        """
+        raise NotImplementedError()
+
+
+class SpeechRecognitionRecognizer(Recognizer):
+    """Base for the engines of the `speech_recognition` package."""
+
+    def __init__(self):
+        self._sr = None
+        self._recognizer = None
+
+    def load(self) -> None:
+        if self._recognizer is None:
+            import speech_recognition as sr
+            self._sr = sr
+            self._recognizer = sr.Recognizer()
+
+    def recognize(self, audio: bytes, sample_rate: int, sample_size: int, timeout: float) -> str:
+        self.load()
+        sr = self._sr
+        self._recognizer.operation_timeout = timeout
+        audio_data = sr.AudioData(audio, sample_rate, sample_size)
+        try:
+            return self._recognize(audio_data).lower()
+        except sr.UnknownValueError:
+            print('Could not understand audio')
+            return None
+
+    def _recognize(self, audio_data) -> str:
+        raise NotImplementedError()
+
+
+class GoogleRecognizer(SpeechRecognitionRecognizer):
+    """Google's web speech API (needs a network connection)."""
+    name = 'google'
+
+    def _recognize(self, audio_data) -> str:
+        return self._recognizer.recognize_google(audio_data)
+
+
+class SphinxRecognizer(SpeechRecognitionRecognizer):
+    """CMU Sphinx, which runs locally (needs pocketsphinx installed)."""
+    name = 'sphinx'
+
+    def _recognize(self, audio_data) -> str:
+        return self._recognizer.recognize_sphinx(audio_data)
+
+
+class StubRecognizer(Recognizer):
+    """Returns fixed responses in order, for testing without a speech engine."""
+    name = 'stub'
+
+    def __init__(self, responses: list[str] = None, delay_t: float = 0.0):
+        """
+        Args:
+            responses: texts to return, repeating from the start when they run out
+            delay_t: seconds each recognition takes, to simulate a slow engine
+        """
+        self._responses = itertools.cycle(responses if responses else [STUB_TEXT])
+        self.delay_t = delay_t
+
+    def recognize(self, audio: bytes, sample_rate: int, sample_size: int, timeout: float) -> str:
+        if self.delay_t > 0:
+            time.sleep(self.delay_t)
+        return next(self._responses)
+
+
+RECOGNIZERS = {r.name: r for r in [GoogleRecognizer, SphinxRecognizer, StubRecognizer]}
+
+
+@dataclass
+class SttResult:
+    """The result of recognizing one command."""
+    request_id: int  # Order the command was submitted in
+    text: str  # The recognized text, None if not understood, timed out or failed
+    latency: float  # Seconds from submitting the audio to the result
+    error: str = None  # Why there's no text, if recognition failed or timed out
+
+
+class SpeechToTextWorker:
+    """Recognizes commands on a background thread.
+
+    The audio loop submits each command's audio and keeps listening; results
+    are polled from the loop when they're ready. The queue of commands waiting
+    for recognition is bounded, so a slow engine drops new commands instead of
+    building up a backlog, and results that took longer than the timeout are
+    discarded (the user has given up on them).
+    """
+    recognizer: Recognizer  # The speech recognition engine
+    dropped: int  # Commands dropped because the queue was full
+
+    def __init__(self, recognizer: Recognizer, sample_rate: int, sample_size: int,
+                 timeout: float = STT_TIMEOUT_T, max_pending: int = MAX_PENDING):
+        """
+        Args:
+            recognizer: the speech recognition engine
+            sample_rate: the sample rate (Hz) of the audio
+            sample_size: the sample size (Bytes) of the audio
+            timeout: seconds a recognition can take before its result is discarded
+            max_pending: commands that can wait for recognition before new ones are dropped
+        """
+        self.recognizer = recognizer
+        self.sample_rate = sample_rate
+        self.sample_size = sample_size
+        self.timeout = timeout
+        self.dropped = 0
+        self._requests = queue.Queue(maxsize=max_pending)
+        self._results = queue.Queue()
+        self._next_id = 0
+        self._loaded = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Starts the worker thread, which loads the recognizer first."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wait_loaded(self, timeout: float = None) -> bool:
+        """Waits for the recognizer to load. Returns True if it has."""
+        return self._loaded.wait(timeout)
+
+    def submit(self, audio: bytes) -> int:
+        """Queues the command audio for recognition without waiting.
+        Returns:
+            the id of the request, or None if the queue was full and it was dropped
+        """
+        request_id = self._next_id
+        try:
+            self._requests.put_nowait((request_id, audio, time.perf_counter()))
+        except queue.Full:
+            self.dropped += 1
+            METRICS.increment('stt.dropped')
+            print('Still recognizing earlier commands, dropped this one')
+            return None
+        self._next_id += 1
+        METRICS.set_gauge('stt.pending', self._requests.qsize())
+        return request_id
+
+    def poll(self) -> SttResult:
+        """Returns the next finished result, or None if there isn't one yet."""
+        try:
+            return self._results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _run(self) -> None:
+        start = time.perf_counter()
+        try:
+            self.recognizer.load()
+            METRICS.record('startup.init.stt', time.perf_counter() - start)
+        except Exception as e:
+            print(f'Could not load {self.recognizer.name} speech recognition, retrying with the first command: {e}')
+        self._loaded.set()
+        while True:
+            request_id, audio, submitted = self._requests.get()
+            self._results.put(self._recognize(request_id, audio, submitted))
+            METRICS.set_gauge('stt.pending', self._requests.qsize())
+
+    def _recognize(self, request_id: int, audio: bytes, submitted: float) -> SttResult:
+        text, error = None, None
+        try:
+            text = self.recognizer.recognize(audio, self.sample_rate, self.sample_size, self.timeout)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            METRICS.increment('stt.errors')
+        latency = time.perf_counter() - submitted
+        METRICS.record('stt', latency)
+        if error is None and latency > self.timeout:
+            text, error = None, f'timed out after {latency:.1f} s'
+            METRICS.increment('stt.timeouts')
+        return SttResult(request_id, text, latency, error)
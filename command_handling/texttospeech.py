@@ -1,7 +1,9 @@
 from gtts import gTTS
-import tempfile
-from pygame import mixer
-import os
+import io
+import threading
+from wake.metrics import METRICS
+from .audiooutput import PLAYER, PlaybackHandle, Player
+from .ttscache import TtsCache
 
 DEFAULT_LANG = 'en'
 DEFAULT_ACCENT = 'us'  # co.uk
@@ -9,59 +11,63 @@ DEFAULT_ACCENT = 'us'  # co.uk
 
 class TextToSpeech:
 
-    def __init__(self, on_pi: bool, lang=DEFAULT_LANG, tld=DEFAULT_ACCENT):
+    def __init__(self, lang=DEFAULT_LANG, tld=DEFAULT_ACCENT, cache: TtsCache = None, player: Player = None):
+        """
+        Args:
+            lang: the language to speak
+            tld: the Google Translate domain, which sets the accent
+            cache: the cache of rendered phrases, uses the default cache if None
+            player: plays the speech, uses the shared player if None
+        """
         self.lang = lang
         self.tld = tld
-        self.speak = self.speak_pi if on_pi else self.speak_windows
-        mixer.init()
+        self.cache = cache if cache is not None else TtsCache()
+        self.player = player if player is not None else PLAYER.get()
 
-    def speak(txt: str) -> None:
-        """Speaks the given text."""
-        pass
-
-    def speak_windows(self, txt):
+    def speak(self, txt: str, wait: bool = False) -> PlaybackHandle:
+        """Speaks the given text, after anything already being spoken.
+        Args:
+            txt: the text to speak
+            wait: if True, returns once the text has been spoken
+        Returns:
+            handle to wait for or cancel the speech, or None if it couldn't be rendered
+        """
         try:
-            speech = gTTS(text=txt, lang=self.lang, tld=self.tld)
-            file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-            filepath = file.name
-            file.close()
-            speech.save(filepath)
-            mixer.music.load(filepath)
-            mixer.music.play()
-            print('Speaking...')
-            while mixer.music.get_busy() == True:
-                continue
-            print('done')
+            with METRICS.time('tts'):
+                data = self.cache.get_or_render(txt, self.lang, self.tld, self._render)
         except Exception as e:
-            print(e)
-        finally:
-            mixer.music.unload()
-            os.remove(filepath)
-                
+            print(f'Could not render speech: {e}')
+            return None
+        handle = self.player.play(data)
+        if wait:
+            handle.wait()
+        return handle
 
-    def speak_pi(self, txt):
-        try:
-            temp_file = tempfile.NamedTemporaryFile(suffix='.mp3')
-            speech = gTTS(text=txt, lang=self.lang, tld=self.tld)
-            speech.write_to_fp(temp_file)
-            mixer.music.load(temp_file.name)
-            mixer.music.play()
-            print('before busy')
-            while mixer.music.get_busy() == True:
-                continue
-            print('done')
-        finally:
-            if temp_file is not None:
-                temp_file.close()
+    def prerender(self, phrases: list[str]) -> threading.Thread:
+        """Renders the phrases into the cache on a background thread, so they play instantly.
+        Returns:
+            the thread rendering the phrases
+        """
+        def render_all():
+            for phrase in phrases:
+                try:
+                    self.cache.get_or_render(phrase, self.lang, self.tld, self._render)
+                except Exception as e:
+                    print(f'Could not pre-render "{phrase}": {e}')
+        thread = threading.Thread(target=render_all, daemon=True)
+        thread.start()
+        return thread
 
-    def __del__(self):
-        mixer.quit()
+    @staticmethod
+    def _render(txt: str, lang: str, tld: str) -> bytes:
+        """Renders the text to MP3 with Google's text to speech."""
+        speech = gTTS(text=txt, lang=lang, tld=tld)
+        buffer = io.BytesIO()
+        speech.write_to_fp(buffer)
+        return buffer.getvalue()
 
 
 if __name__ == "__main__":
-    import os
     txt = 'hello there. this is an example'
-    on_pi = os.name != 'nt'
-    print('On raspberry pi: ', on_pi)
-    tts = TextToSpeech(on_pi)
-    tts.speak(txt)
+    tts = TextToSpeech()
+    tts.speak(txt, wait=True)
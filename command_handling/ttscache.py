@@ -0,0 +1,146 @@
+"""Caches spoken phrases on disk and in memory, so repeated replies don't wait for the network."""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from wake.metrics import METRICS
+
+CACHE_DIR = './cache/tts'  # Directory the rendered phrases are saved in
+MAX_CACHE_BYTES = 50 * 1024 * 1024  # Size of the disk cache before the least recently used phrases are deleted
+MEMORY_ENTRIES = 32  # Number of recently used phrases also kept in memory (as MP3)
+FILE_EXTENSION = '.mp3'
+
+
+class TtsCache:
+    """Content addressed cache of rendered speech, keyed by (text, lang, tld).
+
+    Each phrase is saved as `<sha256 of the key>.mp3`, so the cache survives
+    restarts and needs no index file. The least recently used files are deleted
+    once the cache is larger than `max_bytes` (file modification times record
+    when each was last used), and the most recently used phrases are also kept
+    in memory so they play without reading the disk.
+
+    The memory tier keeps the encoded MP3, not decoded audio. The player
+    streams speech through `mixer.music`, which decodes as it plays (a few
+    milliseconds of work per phrase, overlapped with playback), while decoded
+    PCM would take about ten times the memory per phrase.
+    """
+    hits: int  # Phrases found in memory or on disk
+    misses: int  # Phrases that had to be rendered
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES,
+                 memory_entries: int = MEMORY_ENTRIES):
+        """
+        Args:
+            cache_dir: directory the rendered phrases are saved in
+            max_bytes: size of the disk cache before the least recently used phrases are deleted
+            memory_entries: number of recently used phrases also kept in memory
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # Phrases are pre-rendered on another thread
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        os.makedirs(cache_dir, exist_ok=True)
+        # Size of each file on disk, from least to most recently used
+        files = [(entry.stat().st_mtime, entry.name, entry.stat().st_size) for entry in os.scandir(cache_dir)
+                 if entry.name.endswith(FILE_EXTENSION)]
+        self._disk: OrderedDict[str, int] = OrderedDict(
+            (name[:-len(FILE_EXTENSION)], size) for _, name, size in sorted(files))
+        self._disk_bytes = sum(self._disk.values())
+
+    @staticmethod
+    def key(text: str, lang: str, tld: str) -> str:
+        """Returns the content address of the phrase."""
+        return hashlib.sha256(f'{lang}\0{tld}\0{text}'.encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        """Returns the path the phrase is (or would be) saved at."""
+        return os.path.join(self.cache_dir, key + FILE_EXTENSION)
+
+    def get(self, text: str, lang: str, tld: str) -> bytes:
+        """Returns the rendered phrase, or None if it isn't cached."""
+        key = self.key(text, lang, tld)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            elif key in self._disk:
+                try:
+                    with open(self.path(key), 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    self._forget(key)  # Deleted by something else
+                    return None
+                self._remember(key, data)
+            else:
+                return None
+            self._disk.move_to_end(key)
+        try:
+            os.utime(self.path(key))  # Record the use for the next start
+        except OSError:
+            pass
+        return data
+
+    def put(self, text: str, lang: str, tld: str, data: bytes) -> None:
+        """Saves the rendered phrase, deleting the least recently used phrases if the cache is full."""
+        key = self.key(text, lang, tld)
+        # Write to a temporary file first so a partial file is never used. Each writer gets its
+        # own file, since the same phrase can be rendered on several threads at once
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.get(key, 0)
+            self._disk[key] = len(data)
+            self._disk.move_to_end(key)
+            self._remember(key, data)
+            while self._disk_bytes > self.max_bytes and len(self._disk) > 1:
+                oldest = next(iter(self._disk))
+                self._forget(oldest)
+                try:
+                    os.remove(self.path(oldest))
+                except OSError:
+                    pass
+                METRICS.increment('tts.cache_evictions')
+
+    def get_or_render(self, text: str, lang: str, tld: str, render: Callable[[str, str, str], bytes]) -> bytes:
+        """Returns the cached phrase, rendering and caching it if needed.
+        Args:
+            render: function that renders (text, lang, tld) to MP3 bytes
+        """
+        data = self.get(text, lang, tld)
+        if data is not None:
+            self.hits += 1
+            METRICS.increment('tts.cache_hits')
+            return data
+        self.misses += 1
+        METRICS.increment('tts.cache_misses')
+        with METRICS.time('tts.render'):
+            data = render(text, lang, tld)
+        self.put(text, lang, tld, data)
+        return data
+
+    def _remember(self, key: str, data: bytes) -> None:
+        """Keeps the phrase in memory, dropping the least recently used one if needed."""
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        self._disk_bytes -= self._disk.pop(key, 0)
+        self._memory.pop(key, None)
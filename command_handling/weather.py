@@ -1,45 +1,145 @@
 import os
 import asyncio
+import json
+import threading
+import time
 import python_weather
 import datetime
 
+from wake.metrics import METRICS
+
+CITY = 'Seattle'
 UPDATE_INTERVAL = datetime.timedelta(minutes=10)
+CACHE_PATH = './cache/weather.json'  # The last forecast, so it's available right after a restart
+FIRST_FORECAST_TIMEOUT_T = 5  # Seconds to wait for a forecast if there's never been one
+RETRY_MIN_T = 5  # Seconds before retrying a failed update (doubles after each failure)
+RETRY_MAX_T = 5 * 60  # Longest wait between retries while offline
+OLD_FORECAST_T = 60 * 60  # Seconds after which the forecast is described as old
 
 
 class Weather:
+    """Keeps the forecast up to date in the background.
+
+    A background thread runs its own event loop with one weather client for
+    the whole session, updating the forecast every `UPDATE_INTERVAL` and
+    retrying with exponential backoff while offline. `get_weather` answers
+    right away with the last forecast (also saved to disk for restarts) and
+    asks for an update if it's out of date, instead of waiting for the network.
+    """
+    forecast: dict  # The values the description is made from, None if there's never been a forecast
 
-    def __init__(self):
+    def __init__(self, city: str = CITY, cache_path: str = CACHE_PATH):
+        """
+        Args:
+            city: the city to get the weather of
+            cache_path: file the last forecast is saved in
+        """
         if os.name == 'nt':
             asyncio.set_event_loop_policy(
                 asyncio.WindowsSelectorEventLoopPolicy())
-        self.weather = None
-        self.last_retrieved = None
-        asyncio.run(self._update_weather())
+        self.city = city
+        self.cache_path = cache_path
+        self.forecast = self._load_forecast()
+        self._has_forecast = threading.Event()
+        if self.forecast is not None:
+            self._has_forecast.set()
+        self._loop = asyncio.new_event_loop()
+        self._refresh_now = None  # asyncio.Event created on the loop's thread
+        self._thread = threading.Thread(target=self._loop.run_until_complete,
+                                        args=(self._refresh_forever(),), daemon=True)
+        self._thread.start()
 
-    def get_weather(self):
+    def get_weather(self) -> str:
+        """Describes the weather, using the last forecast without waiting for an update."""
         print('Getting weather...')
-        if self.weather is None or self.last_retrieved is None or (datetime.datetime.now() - self.last_retrieved) > UPDATE_INTERVAL:
-            asyncio.run(self._update_weather())
-        return self._describe_weather()
+        if self._is_stale():
+            METRICS.increment('weather.stale')
+            self._request_refresh()
+        if not self._has_forecast.wait(FIRST_FORECAST_TIMEOUT_T):
+            return 'Sorry, I couldn\'t get the weather'
+        return self._describe_weather(self.forecast)
 
-    def _describe_weather(self):
-        weather = self.weather
-        todays_forecast = next(weather.forecasts)
-        todays_high = todays_forecast.highest_temperature
-        todays_low = todays_forecast.lowest_temperature
-        snowfall = todays_forecast.snowfall
-        
-        description = f'Right now it\'s {weather.current.description}'
-        description += f' and {weather.current.temperature}°,'
-        description += f' with a low today of {todays_low} and a high of {todays_high}.'
+    @staticmethod
+    def _describe_weather(forecast: dict) -> str:
+        if time.time() - forecast['retrieved'] > OLD_FORECAST_T:
+            retrieved = datetime.datetime.fromtimestamp(forecast['retrieved']).strftime('%I:%M %p')
+            description = f'At {retrieved} it was {forecast["description"]}'
+        else:
+            description = f'Right now it\'s {forecast["description"]}'
+        description += f' and {forecast["temperature"]}°,'
+        description += f' with a low today of {forecast["low"]} and a high of {forecast["high"]}.'
         return description
 
-    async def _update_weather(self):
+    def _is_stale(self) -> bool:
+        forecast = self.forecast
+        return forecast is None or time.time() - forecast['retrieved'] > UPDATE_INTERVAL.total_seconds()
+
+    def _request_refresh(self) -> None:
+        """Wakes the background thread to update the forecast now."""
+        if self._refresh_now is not None:
+            self._loop.call_soon_threadsafe(self._refresh_now.set)
+
+    async def _refresh_forever(self):
+        """Updates the forecast whenever it's out of date, until the program exits."""
+        self._refresh_now = asyncio.Event()
+        retry_t = RETRY_MIN_T
         # declare the client. the measuring unit used defaults to the metric system (celcius, km/h, etc.)
         async with python_weather.Client(unit=python_weather.IMPERIAL) as client:
-            # fetch a weather forecast from a city
-            self.weather = await client.get('Seattle')
-        self.last_retrieved = datetime.datetime.now()
+            while True:
+                if self._is_stale():
+                    try:
+                        await self._update_weather(client)
+                        retry_t = RETRY_MIN_T
+                    except Exception as e:
+                        METRICS.increment('weather.update_failures')
+                        print(f'Could not update the weather, retrying in {retry_t} s: {e}')
+                        await self._wait_for_refresh(retry_t)
+                        retry_t = min(retry_t * 2, RETRY_MAX_T)
+                        continue
+                wait_t = self.forecast['retrieved'] + UPDATE_INTERVAL.total_seconds() - time.time()
+                await self._wait_for_refresh(max(wait_t, 0))
+
+    async def _wait_for_refresh(self, timeout: float) -> None:
+        """Sleeps until the timeout or until an update is requested."""
+        try:
+            await asyncio.wait_for(self._refresh_now.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._refresh_now.clear()
+
+    async def _update_weather(self, client):
+        start = time.perf_counter()
+        # fetch a weather forecast from a city
+        weather = await client.get(self.city)
+        todays_forecast = next(weather.forecasts)
+        self.forecast = {
+            'description': weather.current.description,
+            'temperature': weather.current.temperature,
+            'low': todays_forecast.lowest_temperature,
+            'high': todays_forecast.highest_temperature,
+            'retrieved': time.time(),
+        }
+        METRICS.record('weather.update', time.perf_counter() - start)
+        self._has_forecast.set()
+        self._save_forecast()
+
+    def _load_forecast(self) -> dict:
+        """Loads the forecast saved by the last run, or None if there isn't one."""
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_forecast(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            temp_path = self.cache_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self.forecast, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f'Could not save the forecast: {e}')
 
 
 if __name__ == '__main__':
@@ -1,63 +1,130 @@
+import argparse
+import signal
+import sys
+import time
+start_t = time.perf_counter()
 import wake
-import speech_recognition as sr
+from wake.metrics import METRICS
+METRICS.record('startup.import.wake', time.perf_counter() - start_t)
 from command_handling import CommandListener, CommandHandler
-import utils
+from command_handling.speechtotext import RECOGNIZERS, SpeechToTextWorker
 
-# Create the listener
+STATUS_INTERVAL = 0.5  # Seconds between updates of the status line
+METRICS_PATH = './log/metrics.json'  # File the metrics are saved to while running
+METRICS_SAVE_INTERVAL = 30  # Seconds between saves of the metrics
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--profile-startup', action='store_true',
+                    help='Report how long each component takes to import and initialize, then exit')
+parser.add_argument('--stt', choices=list(RECOGNIZERS), default='google', help='Speech recognition engine')
+parser.add_argument('--metrics', default=METRICS_PATH,
+                    help='File the metrics are saved to periodically and on exit (empty to disable)')
+parser.add_argument('--metrics-interval', type=float, default=METRICS_SAVE_INTERVAL,
+                    help='Seconds between saves of the metrics')
+args = parser.parse_args()
+
+# Create the wake word listener first, everything else can load while it listens
 ap = wake.parameters.DEFAULT_AUDIO_PARAMS
-pyaudio, stream = wake.audio_collection.utils.create_stream(ap)
-wake_listener = wake.WakeListener()
+with METRICS.time('startup.init.wake_listener'):
+    capture = wake.audio_collection.AudioCapture(ap)
+    wake_listener = wake.WakeListener(use_silence_gate=True)
+# Swaps in a retrained model when the file is replaced
+model_watcher = wake.ModelWatcher(wake.parameters.FileParams.default_model_path, wake_listener.swap_model)
 command_listener = CommandListener()
-sample_size = pyaudio.get_sample_size(ap.format)
+sample_size = capture.sample_size
 command_handler = CommandHandler(
-    wake_listener, sample_size, ap.sample_rate, utils.is_pi(), True)
+    wake_listener, sample_size, ap.sample_rate, True)
+# Recognizes commands in the background so the wake word is still heard meanwhile
+stt_worker = SpeechToTextWorker(RECOGNIZERS[args.stt](), ap.sample_rate, sample_size)
 state_asleep = True
-recognizer = sr.Recognizer()
-
-
-def speech_to_text(recognizer: sr.Recognizer, audio: bytes) -> str:
-    """
-    Converts speech to text.
-    Args:
-        recognizer: the speech recognizer
-        audio: the audio data to convert
-    Returns:
-        the text
-    """
-    if audio is None:
-        print('No command audio')
-        return ""
-    audio_data = sr.AudioData(audio, ap.sample_rate,
-                              pyaudio.get_sample_size(ap.format))
+last_request_id = -1  # The last command audio sent to speech to text
+cancelled_request_id = -1  # Results up to this request are ignored, since the user woke it again
+speech_end_times = {}  # When the speech of each request being recognized ended (time.perf_counter())
+METRICS.status.interval = STATUS_INTERVAL
+
+
+def handle_command(command_text: str):
+    """Starts the command recognized from the user's speech, without waiting for it."""
+    print(command_text)
     try:
-        text = recognizer.recognize_google(audio_data).lower()
-    except sr.UnknownValueError:
-        print('Could not understand audio')
-        return
-    except sr.RequestError as e:
-        print(f'Request error: {e}')
-        return
-    return text
+        with METRICS.time('command.dispatch'):
+            command_handler.handle(command_text)
+    except Exception as e:
+        print(f'Error handling command:\n{e}')
+
+
+def print_startup_profile():
+    """Prints how long each component took to import and initialize."""
+    latencies = METRICS.snapshot()['latencies']
+    print(f'\n{"component":<32}{"ms":>10}')
+    for name, h in sorted(latencies.items(), key=lambda item: -item[1]['max_ms']):
+        if name.startswith('startup.'):
+            print(f'{name[len("startup."):]:<32}{h["max_ms"]:>10.1f}')
+
+
+# Capture audio in the background so slow commands don't drop audio
+capture.start()
+model_watcher.start()
+METRICS.record('startup.wake_live', time.perf_counter() - start_t)
+print(f'Listening for the wake word after {(time.perf_counter() - start_t):.2f} s')
 
+# Load the command handlers while listening for the wake word
+command_handler.start_background_init()
+stt_worker.start()
+if args.metrics and not args.profile_startup:
+    METRICS.start_saving(args.metrics, args.metrics_interval)
+    # Exit normally when terminated (e.g. by systemd), so the final metrics are saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+if args.profile_startup:
+    for component in command_handler.components:
+        component.wait()
+    stt_worker.wait_loaded()
+    capture.stop()
+    print_startup_profile()
+    exit(0)
 
 while True:
-    data = stream.read(ap.chunk_size, False)
+    data = capture.read()
+    # How long the chunk waited in the capture buffer
+    METRICS.record('capture.lag', capture.lag / ap.chunks_per_sec)
+    METRICS.set_gauge('capture.overruns', capture.overruns)
+    METRICS.set_gauge('capture.device_overflows', capture.device_overflows)
     if state_asleep:
+        command_listener.observe(data)  # Keep track of the background noise
         triggered = wake_listener.check_wake(data)
         if triggered:
             print('WAKE!!!')
             state_asleep = False  # Wake up and listen for command
+            # The user interrupted, so stop answering and forget commands still being recognized
+            command_handler.cancel()
+            cancelled_request_id = last_request_id
     else:
         command_done = command_listener.listen(data)
         if command_done:
             print('Done listening for command')
             state_asleep = True  # Go back to sleep after processing command
             command_audio = command_listener.get_audio()
+            if command_audio is None:
+                print('No command audio')
+            else:
+                request_id = stt_worker.submit(command_audio)
+                if request_id is not None:
+                    last_request_id = request_id
+                    if command_listener.last_speech_t is not None:
+                        # Wall clock time from the last speech to sending the command to speech to text
+                        METRICS.record('command.end_of_speech', time.perf_counter() - command_listener.last_speech_t)
+                        speech_end_times[request_id] = command_listener.last_speech_t
 
-            # Convert speech to text
-            command_text = speech_to_text(recognizer, command_audio)
-            print(command_text)
-            try:
-                command_handler.handle(command_text)
-            except Exception as e:
-                print(f'Error handling command:\n{e}')
+    # Handle commands once they've been recognized
+    result = stt_worker.poll()
+    if result is not None:
+        print(f'Speech to text took {result.latency:.2f} s')
+        speech_end_t = speech_end_times.pop(result.request_id, None)
+        if speech_end_t is not None:
+            METRICS.record('command.speech_to_text', time.perf_counter() - speech_end_t)
+        if result.request_id <= cancelled_request_id:
+            print('Ignoring a command from before the last wake')
+        elif result.error is not None:
+            print(f'Speech to text failed: {result.error}')
+        elif result.text is not None:
+            handle_command(result.text)
@@ -1,8 +1,19 @@
+import argparse
 from command_handling import CommandHandler
+from command_handling.blinds import TCP_IP, TCP_PORT
+from command_handling.fakelights import FakeTuyaDevice
+from command_handling.lights import create_tuya_device
 
 if __name__ == "__main__":
-    import utils
-    command_handler = CommandHandler(None, sample_size=16000, sample_rate=2, is_pi=utils.is_pi(), save_activations=False)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--blinds', default=f'{TCP_IP}:{TCP_PORT}',
+                        help='IP:port of the blinds\' ESP32 (e.g. a local command_handling.fakeblinds)')
+    parser.add_argument('--fake-lights', action='store_true', help='Use stand-ins instead of the Tuya lights')
+    args = parser.parse_args()
+    blinds_ip, blinds_port = args.blinds.rsplit(':', 1)
+    command_handler = CommandHandler(None, sample_size=16000, sample_rate=2, save_activations=False,
+                                     blinds_address=(blinds_ip, int(blinds_port)),
+                                     light_device_factory=FakeTuyaDevice if args.fake_lights else create_tuya_device)
     while True:
         command = input('Enter a command: ')
-        command_handler.handle(command)
\ No newline at end of file
+        command_handler.handle(command)
@@ -1,3 +1,4 @@
 from .listener import WakeListener
+from .modelwatcher import ModelWatcher
 from . import audio_collection
 from . import parameters
\ No newline at end of file
@@ -1,2 +1,3 @@
 from .sample_collector import SampleCollector, COLLECTION_MODES
+from .audio_capture import AudioCapture
 from .utils import *
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""Captures audio in the background so slow consumers don't cause dropped audio."""
+import threading
+import pyaudio
+from . import utils
+
+BUFFER_T = 15  # Seconds of audio the ring buffer can hold before overrunning
+READ_POLL_T = 0.1  # Seconds to wait between checks for new audio while reading
+
+
+class AudioCapture:
+    """Records audio with a PyAudio callback into a preallocated ring buffer.
+
+    The callback (producer) only copies each chunk into the next free slot, so
+    the stream is never blocked by feature extraction, inference, speech to text
+    or text to speech in the consumer. There is one producer and one consumer
+    which each only advance their own index, so no locks are needed.
+
+    If the consumer falls so far behind that the buffer is full, new chunks are
+    dropped and counted as overruns.
+    """
+    overruns: int  # Chunks dropped because the ring buffer was full
+    device_overflows: int  # Callbacks where PyAudio reported an input overflow
+    max_lag: int  # Most chunks that were waiting to be read at once
+
+    def __init__(self, audio_params, buffer_t: float = BUFFER_T, input_device_index: int = None):
+        """
+        Args:
+            audio_params: `parameters.AudioParams` the audio parameters
+            buffer_t: seconds of audio the ring buffer can hold
+            input_device_index: index of the microphone to record from, None for the default
+        """
+        self.ap = audio_params
+        self.input_device_index = input_device_index
+        self.sample_size = pyaudio.get_sample_size(audio_params.format)
+        self.chunk_bytes = audio_params.chunk_size * self.sample_size
+        self.capacity = max(1, int(buffer_t * audio_params.chunks_per_sec))
+        self._buffer = bytearray(self.capacity * self.chunk_bytes)
+        self._lengths = [0] * self.capacity  # Number of bytes in each slot
+        self._write_count = 0  # Total chunks written (only changed by the producer)
+        self._read_count = 0  # Total chunks read (only changed by the consumer)
+        self._new_audio = threading.Event()
+
+        self.overruns = 0
+        self.device_overflows = 0
+        self.max_lag = 0
+        self._pyaudio = None
+        self._stream = None
+
+    @property
+    def lag(self) -> int:
+        """Number of captured chunks waiting to be read."""
+        return self._write_count - self._read_count
+
+    def start(self) -> None:
+        """Opens the stream and starts capturing audio."""
+        self._pyaudio, self._stream = utils.create_stream(self.ap, stream_callback=self._on_audio,
+                                                          input_device_index=self.input_device_index)
+        self._stream.start_stream()
+
+    def stop(self) -> None:
+        """Stops capturing audio and closes the stream."""
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pyaudio is not None:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+
+    def read(self, timeout: float = None) -> bytes:
+        """Returns the oldest chunk of audio that hasn't been read, waiting for one if needed.
+        Args:
+            timeout: maximum seconds to wait, None to wait forever
+        Returns:
+            the chunk of audio, or None if the timeout expired
+        """
+        waited = 0.0
+        while self.lag <= 0:
+            if timeout is not None and waited >= timeout:
+                return None
+            self._new_audio.wait(READ_POLL_T)
+            self._new_audio.clear()
+            waited += READ_POLL_T
+
+        slot = self._read_count % self.capacity
+        start = slot * self.chunk_bytes
+        data = bytes(memoryview(self._buffer)[start:start + self._lengths[slot]])
+        self._read_count += 1
+        return data
+
+    def stats(self) -> str:
+        """Describes the capture counters."""
+        return (f'captured {self._write_count} chunks, lag {self.lag}/{self.capacity} (max {self.max_lag}), '
+                f'{self.overruns} overruns, {self.device_overflows} device overflows')
+
+    def _on_audio(self, in_data: bytes, frame_count: int, time_info: dict, status_flags: int):
+        """PyAudio callback that copies the chunk into the ring buffer."""
+        if status_flags & pyaudio.paInputOverflow:
+            self.device_overflows += 1
+
+        lag = self.lag
+        if lag >= self.capacity:
+            self.overruns += 1
+        else:
+            slot = self._write_count % self.capacity
+            start = slot * self.chunk_bytes
+            length = min(len(in_data), self.chunk_bytes)
+            self._buffer[start:start + length] = memoryview(in_data)[:length]
+            self._lengths[slot] = length
+            self._write_count += 1
+            self.max_lag = max(self.max_lag, lag + 1)
+            self._new_audio.set()
+        return (None, pyaudio.paContinue)
@@ -16,10 +16,13 @@ def save_wav_file(filename: str, sample_size: int, sample_rate: int, data: bytes
     wf.close()
 
 
-def create_stream(audio_params) -> (pyaudio.PyAudio, pyaudio.Stream):
+def create_stream(audio_params, stream_callback=None, input_device_index=None) -> (pyaudio.PyAudio, pyaudio.Stream):
     """Creates a pyaudio stream to record audio.
     Args:
         audio_params: `parameters.AudioParams` the audio parameters
+        stream_callback: optional callback to receive the audio (callback mode)
+            instead of reading from the stream
+        input_device_index: index of the microphone to record from, None for the default
     Returns:
         the pyaudio object and the stream object
     """
@@ -29,7 +32,9 @@ def create_stream(audio_params) -> (pyaudio.PyAudio, pyaudio.Stream):
         channels=1,
         format=audio_params.format,
         frames_per_buffer=audio_params.chunk_size,
-        input=True
+        input=True,
+        stream_callback=stream_callback,
+        input_device_index=input_device_index
     )
     return p, stream
 
@@ -42,17 +47,12 @@ def get_greatest_index(dir: str) -> int:
         the index of the last file in the directory
     """
     import os
-    files = os.listdir(dir)
-    if len(files) < 1:
-        return -1
-    files.sort()
-
-    try:
-        last_file = files[-1]
-        name = last_file[:-4]
-        number = name.split('-')[1]
-        last_index = int(number)
-        return last_index
-    except Exception as e:
-        print(f'error getting index from last file in directory {dir}')
-        return -1
+    last_index = -1
+    # Compare the numbers rather than sorting names, so index 10000 comes after 9999,
+    # and skip files that aren't named <prefix>-<index>.<extension>
+    for file in os.listdir(dir):
+        name = os.path.splitext(file)[0]
+        number = name.rsplit('-', 1)[-1]
+        if '-' in name and number.isdigit():
+            last_index = max(last_index, int(number))
+    return last_index
@@ -0,0 +1,185 @@
+"""
+Measures how long the wake word listener takes to process each chunk of audio.
+
+Replays WAV files (or synthetic audio) through the same stages as
+`WakeListener.check_wake` as fast as possible and reports the p50/p95/p99
+latency of each stage, the real-time factor and the peak memory use. The
+results are saved as JSON so runs can be compared across commits and machines.
+
+Run from the repository root:
+    python -m wake.benchmark_listener [WAV files...] [--model PATH]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+import wave
+import numpy as np
+
+from wake.listener.activationtrigger import ActivationTrigger
+from wake.listener.featurestream import FeatureStream
+from wake.listener.silencegate import SilenceGate
+from wake.modelwrapper import get_model_wrapper
+from wake.parameters import DEFAULT_AUDIO_PARAMS as AP, FileParams as FP
+
+STAGES = ['convert', 'mfcc', 'inference', 'trigger']
+PERCENTILES = [50, 95, 99]
+SYNTHETIC_AUDIO_T = 60  # Seconds of synthetic audio used when no files are given
+
+
+def load_wav_chunks(path: str) -> list[bytes]:
+    """Loads a 16 bit mono WAV file recorded at the listener's sample rate as chunks."""
+    with wave.open(path, 'rb') as wf:
+        assert (wf.getsampwidth() == 2 and wf.getnchannels() == 1), f'Expected 16 bit mono audio: {path}'
+        assert (wf.getframerate() == AP.sample_rate), f'Expected {AP.sample_rate} Hz audio: {path}'
+        data = wf.readframes(wf.getnframes())
+    chunk_bytes = AP.chunk_size * 2
+    return [data[i:i + chunk_bytes] for i in range(0, len(data) - chunk_bytes + 1, chunk_bytes)]
+
+
+def synthetic_chunks(seconds: float) -> list[bytes]:
+    """Makes alternating seconds of silence and noisy tones split into chunks."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * AP.sample_rate)) / AP.sample_rate
+    audio = 0.2 * np.sin(2 * np.pi * 300 * t) + 0.05 * rng.standard_normal(len(t))
+    audio[(t.astype(int) % 2) == 0] = 0  # Silence every other second
+    data = (audio * 32767).astype('<i2').tobytes()
+    chunk_bytes = AP.chunk_size * 2
+    return [data[i:i + chunk_bytes] for i in range(0, len(data) - chunk_bytes + 1, chunk_bytes)]
+
+
+def run_benchmark(model, chunks: list[bytes], use_silence_gate: bool) -> tuple[dict, int]:
+    """Processes the chunks like `WakeListener.check_wake` and times each stage.
+    Returns:
+        dict mapping each stage to a list of latencies in seconds, and the number of triggers
+    """
+    features = FeatureStream(AP)
+    trigger = ActivationTrigger()
+    gate = SilenceGate(AP) if use_silence_gate else None
+    latencies = {stage: [] for stage in STAGES + ['total']}
+    triggers = 0
+
+    for data in chunks:
+        start = time.perf_counter()
+        audio = np.frombuffer(data, dtype='<i2')
+        convert_t = mfcc_t = 0
+        added = 0
+        # Same loop as `FeatureStream.update`, since a nearly full buffer only takes part of the chunk
+        while added < len(audio):
+            step = time.perf_counter()
+            added += features.add_audio(audio[added:])
+            converted = time.perf_counter()
+            features.calculate_new_features()
+            convert_t += converted - step
+            mfcc_t += time.perf_counter() - converted
+        mfccs = features.features
+        calculated = time.perf_counter()
+        latencies['convert'].append(convert_t)
+        latencies['mfcc'].append(mfcc_t)
+
+        if gate is not None and gate.is_silent(data):
+            latencies['total'].append(time.perf_counter() - start)
+            continue
+        prediction = model.predict(mfccs)
+        predicted = time.perf_counter()
+        triggers += trigger.check_trigger(prediction)
+        end = time.perf_counter()
+        latencies['inference'].append(predicted - calculated)
+        latencies['trigger'].append(end - predicted)
+        latencies['total'].append(end - start)
+    return latencies, triggers
+
+
+def summarize(latencies: dict, audio_t: float) -> dict:
+    """Calculates the percentiles (ms) of each stage and the real-time factor."""
+    summary = {}
+    for stage, values in latencies.items():
+        values = np.array(values) * 1000
+        summary[stage] = {'count': len(values)}
+        for p in PERCENTILES:
+            summary[stage][f'p{p}_ms'] = float(np.percentile(values, p)) if len(values) > 0 else None
+    processing_t = float(np.sum(latencies['total']))
+    summary['audio_s'] = audio_t
+    summary['processing_s'] = processing_t
+    summary['real_time_factor'] = processing_t / audio_t  # Below 1 is faster than real time
+    summary['chunk_budget_ms'] = 1000 / AP.chunks_per_sec
+    return summary
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident memory of the process in MB (None if not supported)."""
+    try:
+        import resource
+    except ImportError:
+        return None  # Not available on Windows
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return rss / 1024 / 1024 if platform.system() == 'Darwin' else rss / 1024
+
+
+def git_commit() -> str:
+    """Returns the current git commit, or None if it can't be found."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(summary: dict):
+    print(f'\n{"stage":<12}{"count":>8}' + ''.join(f'{f"p{p} (ms)":>12}' for p in PERCENTILES))
+    for stage in STAGES + ['total']:
+        row = summary[stage]
+        values = ''.join(f'{row[f"p{p}_ms"]:>12.4f}' if row[f'p{p}_ms'] is not None else f'{"-":>12}'
+                         for p in PERCENTILES)
+        print(f'{stage:<12}{row["count"]:>8}{values}')
+    print(f'\n{summary["audio_s"]:.1f} s of audio processed in {summary["processing_s"]:.2f} s, '
+          f'real-time factor {summary["real_time_factor"]:.4f} '
+          f'(budget {summary["chunk_budget_ms"]:.1f} ms per chunk)')
+    if summary['peak_rss_mb'] is not None:
+        print(f'peak RSS {summary["peak_rss_mb"]:.1f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('wav_paths', nargs='*', help='16 bit mono WAV files to replay (synthetic audio if none)')
+    parser.add_argument('-m', '--model', default=FP.default_model_path, help='Path to the model')
+    parser.add_argument('-g', '--silence-gate', action='store_true', help='Skip the model while the audio is silent')
+    parser.add_argument('-o', '--output', help='Path of the JSON results (defaults to the log directory)')
+    args = parser.parse_args()
+
+    if args.wav_paths:
+        chunks = [chunk for path in args.wav_paths for chunk in load_wav_chunks(path)]
+    else:
+        chunks = synthetic_chunks(SYNTHETIC_AUDIO_T)
+    audio_t = len(chunks) * AP.chunk_size / AP.sample_rate
+
+    model = get_model_wrapper(args.model)
+    latencies, triggers = run_benchmark(model, chunks, args.silence_gate)
+    summary = summarize(latencies, audio_t)
+    summary['peak_rss_mb'] = peak_rss_mb()
+    summary['triggers'] = triggers
+    print_summary(summary)
+
+    results = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'model': args.model,
+        'silence_gate': args.silence_gate,
+        'inputs': args.wav_paths or ['synthetic'],
+        'results': summary,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(FP.log_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(FP.log_dir, f'benchmark-{results["commit"]}-{timestamp}.json')
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Saved results to {output}')
@@ -0,0 +1,69 @@
+"""
+Checks that the in-house MFCC calculation matches sonopy (which the model was
+trained with) and compares how long each takes.
+
+Uses a few seconds of synthetic audio, or a 16 bit mono WAV file if given.
+"""
+import argparse
+import timeit
+import wave
+import numpy as np
+from sonopy import mfcc_spec
+from mfcc import get_mfcc_calculator
+from parameters import DEFAULT_AUDIO_PARAMS as AP
+
+TOLERANCE = 1e-6  # Maximum allowed absolute difference between the MFCCs
+SYNTHETIC_AUDIO_T = 5  # Length of the synthetic audio in seconds
+REPEATS = 20  # Number of times to time each implementation
+
+
+def synthetic_audio(seconds: float) -> np.ndarray:
+    """Makes audio with tones, noise and silence to cover the different kinds of frames."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * AP.sample_rate)) / AP.sample_rate
+    audio = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.1 * np.sin(2 * np.pi * 3000 * t)
+    audio += 0.05 * rng.standard_normal(len(t))
+    audio[:AP.sample_rate // 2] = 0  # Leading silence
+    return audio
+
+
+def load_wav(path: str) -> np.ndarray:
+    """Loads a 16 bit mono WAV file as normalized audio."""
+    with wave.open(path, 'rb') as wf:
+        assert (wf.getsampwidth() == 2 and wf.getnchannels() == 1), f'Expected 16 bit mono audio: {path}'
+        data = wf.readframes(wf.getnframes())
+    return np.frombuffer(data, dtype='<i2') / 32768.0
+
+
+def sonopy_mfcc(audio: np.ndarray) -> np.ndarray:
+    return mfcc_spec(audio=audio,
+                     sample_rate=AP.sample_rate,
+                     window_stride=(AP.window_samples, AP.hop_samples),
+                     num_filt=AP.n_filt,
+                     fft_size=AP.n_fft,
+                     num_coeffs=AP.n_mfcc)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('wav_path', nargs='?', help='Optional WAV file to use instead of synthetic audio')
+    args = parser.parse_args()
+    audio = load_wav(args.wav_path) if args.wav_path else synthetic_audio(SYNTHETIC_AUDIO_T)
+    calculator = get_mfcc_calculator(AP)
+
+    # Check parity
+    expected = sonopy_mfcc(audio)
+    actual = calculator.calculate(audio)
+    assert (expected.shape == actual.shape), f'Shapes differ {expected.shape} != {actual.shape}'
+    max_difference = np.max(np.abs(expected - actual))
+    print(f'{len(actual)} frames, max difference {max_difference:.3g}')
+    assert (max_difference < TOLERANCE), f'MFCCs differ by more than {TOLERANCE}'
+
+    # Compare the whole signal and a single chunk (like the live listener)
+    chunk = audio[:AP.window_samples + AP.chunk_size]
+    for name, samples in [('signal', audio), ('chunk', chunk)]:
+        sonopy_t = min(timeit.repeat(lambda: sonopy_mfcc(samples), number=1, repeat=REPEATS))
+        calculator_t = min(timeit.repeat(lambda: calculator.calculate(samples), number=1, repeat=REPEATS))
+        print(f'{name:<8} sonopy {sonopy_t * 1000:>8.3f} ms'
+              f'\tin-house {calculator_t * 1000:>8.3f} ms'
+              f'\tspeedup {sonopy_t / calculator_t:>5.1f}x')
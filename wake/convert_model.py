@@ -1,17 +1,42 @@
 """
 Converts a model from Keras into TensorFlow Lite format.
+
+Optionally applies post-training quantization (dynamic range, float16 or full
+int8) and reports the accuracy, size and latency of each converted model on the
+validation set.
 """
+import os
+import time
+import numpy as np
 import tensorflow as tf
 from tensorflow import keras
+from modelwrapper import TFLiteModelWrapper
+from parameters import FileParams as FP
+
+NO_QUANTIZATION = 'none'
+DYNAMIC_QUANTIZATION = 'dynamic'  # Weights in int8, activations in float
+FLOAT16_QUANTIZATION = 'float16'  # Weights in float16
+INT8_QUANTIZATION = 'int8'  # Weights and activations in int8 (inputs and outputs stay float)
+QUANTIZATIONS = [NO_QUANTIZATION, DYNAMIC_QUANTIZATION, FLOAT16_QUANTIZATION, INT8_QUANTIZATION]
+
+REPRESENTATIVE_SAMPLES = 500  # Number of samples used to calibrate the int8 model
+LATENCY_SAMPLES = 500  # Number of single predictions to time for the report
+RANDOM_SEED = 0
 
 
-def convert_model(model_path: str, save_path: str = None):
+def convert_model(model_path: str, save_path: str = None, quantization: str = NO_QUANTIZATION,
+                  representative_x: np.ndarray = None):
     """Converts a model from Keras into TensorFlow Lite format.
     Args:
         model_path: Path to the Keras model
-        optimizations: List of optimizations to apply to the model
         save_path: Path to save the model to. If None, saves to the same directory as the model.
+        quantization: the post-training quantization to apply, one of `QUANTIZATIONS`
+        representative_x: model inputs used to calibrate the int8 quantization
+    Returns:
+        the path the model was saved to
     """
+    assert (quantization in QUANTIZATIONS), f'Invalid quantization {quantization}. Must be one of {QUANTIZATIONS}'
+
     # Load the model
     keras_model = keras.models.load_model(model_path)
     print('Loaded model')
@@ -24,20 +49,86 @@ def convert_model(model_path: str, save_path: str = None):
         # Below needs to be disabled to run on raspberry pi
         # tf.lite.OpsSet.SELECT_TF_OPS  # enable TensorFlow ops.
     ]
+    _set_quantization(converter, quantization, representative_x)
 
     tflite_model = converter.convert()
 
     # Save the model
     if save_path is None:
         # Get file name from path
-        import os
         assert (os.path.isdir(model_path))
         save_path = os.path.basename(model_path) + '.tflite'
     if not save_path.endswith('.tflite'):
         save_path += '.tflite'
     with open(save_path, 'wb') as f:
         f.write(tflite_model)
-    print(f'Saved model to {save_path}')
+    print(f'Saved {quantization} model to {save_path}')
+    return save_path
+
+
+def _set_quantization(converter, quantization: str, representative_x: np.ndarray):
+    """Sets the converter options for the post-training quantization."""
+    if quantization == NO_QUANTIZATION:
+        return
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == FLOAT16_QUANTIZATION:
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == INT8_QUANTIZATION:
+        assert (representative_x is not None), 'int8 quantization needs representative data'
+
+        def representative_dataset():
+            for x in representative_x:
+                yield [x[np.newaxis].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+
+def load_representative_data(dataset: str = 'train', samples: int = REPRESENTATIVE_SAMPLES) -> np.ndarray:
+    """Loads a random subset of the preprocessed inputs to calibrate the int8 quantization.
+    Args:
+        dataset: the preprocessed dataset to use (`{dataset}_x.npy` in the data directory)
+        samples: the number of inputs to use
+    """
+    x = np.load(os.path.join(FP.data_dir, f'{dataset}_x.npy'), mmap_mode='r')
+    rng = np.random.default_rng(RANDOM_SEED)
+    indices = np.sort(rng.choice(len(x), size=min(samples, len(x)), replace=False))
+    return np.asarray(x[indices])
+
+
+def evaluate_model(tflite_path: str, x: np.ndarray, y: np.ndarray) -> dict:
+    """Measures the accuracy, size and latency of a TensorFlow Lite model.
+    Args:
+        tflite_path: path to the model
+        x: model inputs
+        y: labels for the inputs
+    Returns:
+        dict with the accuracy (%), size (KB) and median/p95 latency (ms) of single predictions
+    """
+    model = TFLiteModelWrapper(tflite_path, on_pi=False)
+    predictions = model.predict_batch(x)
+    accuracy = np.mean(np.round(predictions) == y) * 100
+
+    latencies = []
+    for input in x[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        model.predict(input)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {
+        'accuracy': accuracy,
+        'size': os.path.getsize(tflite_path) / 1024,
+        'latency_p50': np.percentile(latencies, 50),
+        'latency_p95': np.percentile(latencies, 95),
+    }
+
+
+def print_report(results: dict[str, dict]):
+    """Prints the evaluation of each model side by side."""
+    print(f'\n{"model":<12}{"accuracy":>10}{"size (KB)":>12}{"p50 (ms)":>10}{"p95 (ms)":>10}')
+    for name, r in results.items():
+        print(f'{name:<12}{r["accuracy"]:>9.2f}%{r["size"]:>12.1f}'
+              f'{r["latency_p50"]:>10.3f}{r["latency_p95"]:>10.3f}')
 
 
 # If this file is being run directly, convert the model
@@ -45,5 +136,24 @@ if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('model_path', type=str, help='Path to the keras model')
+    parser.add_argument('-q', '--quantization', default=NO_QUANTIZATION, choices=QUANTIZATIONS + ['all'],
+                        help='Post-training quantization to apply, "all" converts every variant')
+    parser.add_argument('-r', '--report', action='store_true',
+                        help='Report the accuracy, size and latency of each model on the validation set')
     args = parser.parse_args()
-    convert_model(args.model_path, 'trained_model.tflite')
+
+    quantizations = QUANTIZATIONS if args.quantization == 'all' else [args.quantization]
+    representative_x = None
+    if INT8_QUANTIZATION in quantizations:
+        representative_x = load_representative_data()
+
+    saved = {}
+    for quantization in quantizations:
+        # The unquantized model keeps the default name used by the listener
+        name = 'trained_model' if quantization == NO_QUANTIZATION else f'trained_model_{quantization}'
+        saved[quantization] = convert_model(args.model_path, f'{name}.tflite', quantization, representative_x)
+
+    if args.report:
+        val_x = np.load(os.path.join(FP.data_dir, 'val_x.npy'))
+        val_y = np.load(os.path.join(FP.data_dir, 'val_y.npy'))
+        print_report({q: evaluate_model(path, val_x, val_y) for q, path in saved.items()})
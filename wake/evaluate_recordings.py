@@ -0,0 +1,208 @@
+"""
+Evaluates a wake word model over long recordings much faster than real time.
+
+Instead of feeding the audio chunk by chunk through `WakeListener.check_wake`,
+all the MFCCs of a file are calculated in one pass, the model input windows are
+views into the MFCC array (no copies), and the windows are scored in large
+batches. `ActivationTrigger` is then replayed over the predictions, giving the
+same triggers as the live listener.
+
+Positive recordings should each contain the wake word (detected if they trigger
+at least once) and negative recordings should never contain it (every trigger
+is a false accept).
+
+Run from the repository root:
+    python -m wake.evaluate_recordings --positive POS_FILES_OR_DIRS --negative NEG_FILES_OR_DIRS
+"""
+import argparse
+import os
+import time
+import wave
+import numpy as np
+
+from wake.listener.activationtrigger import ActivationTrigger
+from wake.mfcc import get_mfcc_calculator
+from wake.modelwrapper import ModelWrapper, get_model_wrapper
+from wake.parameters import AudioParams, DEFAULT_AUDIO_PARAMS, FileParams as FP
+
+VALID_FILE_TYPES = ['.wav', '.mp3']
+BATCH_SIZE = 1024  # Number of windows to score in each call to the model
+# Seconds of audio converted to MFCCs at once. This bounds the float working memory of the
+# conversion; the 16 bit recording itself is loaded whole (about 115 MB per hour of audio)
+BLOCK_T = 600
+
+
+def load_audio(path: str, ap: AudioParams = DEFAULT_AUDIO_PARAMS) -> np.ndarray:
+    """Loads a recording as 16 bit samples at the listener's sample rate.
+
+    16 bit mono WAV files at the right sample rate are read directly, anything
+    else is converted with librosa. The whole recording is loaded into memory.
+    """
+    if path.lower().endswith('.wav'):
+        with wave.open(path, 'rb') as wf:
+            if wf.getsampwidth() == 2 and wf.getnchannels() == 1 and wf.getframerate() == ap.sample_rate:
+                return np.frombuffer(wf.readframes(wf.getnframes()), dtype='<i2')
+    import librosa
+    audio, _ = librosa.load(path, sr=ap.sample_rate, mono=True)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def calculate_mfccs(audio: np.ndarray, ap: AudioParams = DEFAULT_AUDIO_PARAMS) -> np.ndarray:
+    """Calculates the MFCCs of the whole recording, in blocks to limit the memory of the float conversion.
+    Args:
+        audio: 16 bit samples
+    Returns:
+        (n_frames, n_mfcc) array with the same frames the live listener calculates
+    """
+    calculator = get_mfcc_calculator(ap)
+    n_frames = calculator.n_frames(len(audio))
+    mfccs = np.empty((n_frames, calculator.n_mfcc))
+    block_frames = max(1, int(BLOCK_T * ap.sample_rate) // ap.hop_samples)
+    for first in range(0, n_frames, block_frames):
+        last = min(first + block_frames, n_frames)
+        # Samples covering frames [first, last)
+        samples = audio[first * ap.hop_samples:(last - 1) * ap.hop_samples + ap.window_samples]
+        mfccs[first:last] = calculator.calculate(samples / 32768.0)
+    return mfccs
+
+
+def chunk_windows(mfccs: np.ndarray, n_samples: int, ap: AudioParams = DEFAULT_AUDIO_PARAMS):
+    """Gets the model input the live listener would have after each chunk.
+    Args:
+        mfccs: the MFCCs of the recording
+        n_samples: the number of samples in the recording
+    Returns:
+        windows: (n_frames + 1, n_features, n_mfcc) view of every window of features
+        indices: index into windows of the input used after each chunk
+    """
+    # The listener starts with silent (zero) features
+    padded = np.concatenate((np.zeros((ap.n_features, mfccs.shape[1])), mfccs))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, (ap.n_features, mfccs.shape[1]))[:, 0]
+    # After each chunk, the window ends with the last frame completed so far
+    chunk_ends = np.arange(1, n_samples // ap.chunk_size + 1) * ap.chunk_size
+    indices = np.where(chunk_ends >= ap.window_samples,
+                       (chunk_ends - ap.window_samples) // ap.hop_samples + 1, 0)
+    return windows, indices
+
+
+def predict_recording(model: ModelWrapper, audio: np.ndarray, ap: AudioParams = DEFAULT_AUDIO_PARAMS) -> np.ndarray:
+    """Predicts the wake word probability after each chunk of the recording.
+    Args:
+        model: the model to use
+        audio: 16 bit samples
+    Returns:
+        array with the prediction for each chunk
+    """
+    windows, indices = chunk_windows(calculate_mfccs(audio, ap), len(audio), ap)
+    predictions = np.empty(len(indices), dtype=np.float32)
+    for start in range(0, len(indices), BATCH_SIZE):
+        # Only the windows in this batch are copied
+        batch = windows[indices[start:start + BATCH_SIZE]]
+        predictions[start:start + len(batch)] = model.predict_batch(batch, BATCH_SIZE)
+    return predictions
+
+
+def replay_trigger(predictions: np.ndarray, trigger: ActivationTrigger = None) -> np.ndarray:
+    """Runs the activation trigger over the predictions.
+    Returns:
+        indices of the chunks where the trigger activated
+    """
+    trigger = trigger if trigger is not None else ActivationTrigger()
+    return np.flatnonzero(trigger.check_triggers(predictions))
+
+
+def find_recordings(paths: list[str]) -> list[str]:
+    """Expands directories into the audio files inside them."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in sorted(names)
+                          if os.path.splitext(n)[1].lower() in VALID_FILE_TYPES]
+        else:
+            files.append(path)
+    return files
+
+
+def evaluate(model: ModelWrapper, positive: list[str], negative: list[str],
+             ap: AudioParams = DEFAULT_AUDIO_PARAMS, verbose: bool = True) -> dict:
+    """Evaluates the model over the recordings.
+    Args:
+        model: the model to use
+        positive: recordings that contain the wake word
+        negative: recordings that don't contain the wake word
+    Returns:
+        dict with the results of each file, the aggregate metrics, and the
+        predictions of each file (to cache for threshold tuning)
+    """
+    files, predictions = [], {}
+    for label, paths in [(True, positive), (False, negative)]:
+        for path in paths:
+            audio = load_audio(path, ap)
+            predictions[path] = predict_recording(model, audio, ap)
+            triggers = replay_trigger(predictions[path])
+            result = {
+                'path': path,
+                'positive': label,
+                'duration_s': len(audio) / ap.sample_rate,
+                'triggers': len(triggers),
+                'trigger_times_s': (triggers + 1) * ap.chunk_size / ap.sample_rate,
+            }
+            files.append(result)
+            if verbose:
+                print(f'{"pos" if label else "neg"}  {result["triggers"]:>4} triggers'
+                      f'  {result["duration_s"]:>9.1f} s  {path}')
+
+    positives = [f for f in files if f['positive']]
+    negatives = [f for f in files if not f['positive']]
+    negative_hours = sum(f['duration_s'] for f in negatives) / 3600
+    false_accepts = sum(f['triggers'] for f in negatives)
+    missed = sum(1 for f in positives if f['triggers'] == 0)
+    metrics = {
+        'positive_files': len(positives),
+        'negative_files': len(negatives),
+        'negative_hours': negative_hours,
+        'false_accepts': false_accepts,
+        'false_accepts_per_hour': false_accepts / negative_hours if negative_hours > 0 else None,
+        'false_rejects': missed,
+        'false_reject_rate': missed / len(positives) if len(positives) > 0 else None,
+    }
+    return {'files': files, 'metrics': metrics, 'predictions': predictions}
+
+
+def save_predictions(path: str, results: dict):
+    """Saves the predictions of each file so the trigger can be tuned without rerunning the model."""
+    files = {f['path']: f for f in results['files']}
+    paths = list(results['predictions'])
+    np.savez_compressed(path,
+                        paths=np.array(paths),
+                        positive=np.array([files[p]['positive'] for p in paths]),
+                        durations=np.array([files[p]['duration_s'] for p in paths]),
+                        **{f'predictions_{i}': results['predictions'][p] for i, p in enumerate(paths)})
+    print(f'Saved predictions to {path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--positive', nargs='*', default=[], help='Files or directories with the wake word')
+    parser.add_argument('-n', '--negative', nargs='*', default=[], help='Files or directories without the wake word')
+    parser.add_argument('-m', '--model', default=FP.default_model_path, help='Path to the model')
+    parser.add_argument('-s', '--save-predictions', help='Path of a .npz file to cache the predictions in')
+    args = parser.parse_args()
+
+    model = get_model_wrapper(args.model)
+    start = time.perf_counter()
+    results = evaluate(model, find_recordings(args.positive), find_recordings(args.negative))
+    elapsed = time.perf_counter() - start
+
+    metrics = results['metrics']
+    audio_hours = sum(f['duration_s'] for f in results['files']) / 3600
+    print(f'\nEvaluated {audio_hours:.2f} hours of audio in {elapsed:.1f} s')
+    if metrics['false_accepts_per_hour'] is not None:
+        print(f'False accepts: {metrics["false_accepts"]} in {metrics["negative_hours"]:.2f} hours '
+              f'({metrics["false_accepts_per_hour"]:.3f} per hour)')
+    if metrics['false_reject_rate'] is not None:
+        print(f'False rejects: {metrics["false_rejects"]}/{metrics["positive_files"]} '
+              f'({metrics["false_reject_rate"] * 100:.2f}%)')
+    if args.save_predictions:
+        save_predictions(args.save_predictions, results)
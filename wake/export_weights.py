@@ -0,0 +1,203 @@
+"""
+Exports the wake word model's weights for `NumpyModelWrapper`.
+
+Reads the weights from a Keras checkpoint (needs tensorflow) or a TensorFlow
+Lite model (needs tflite_runtime or tensorflow), saves them as a .npz file,
+and checks the NumPy model gives the same predictions as the original on
+real model inputs (the validation set, or windows of recordings). The .npz
+file can then be used anywhere a model path is accepted, without installing
+tensorflow.
+
+The check needs inputs the model scores anywhere from 0 to 1, since windows
+that all score about 0 would match even with wrongly exported weights. It
+exits with an error if the predictions differ by more than the tolerance.
+
+Run from the repository root:
+    python -m wake.export_weights wake/trained_model.tflite [--output wake/trained_model.npz]
+        [--parity-data VAL_X_NPY_OR_RECORDINGS...]
+"""
+import argparse
+import os
+import numpy as np
+
+from wake.evaluate_recordings import calculate_mfccs, chunk_windows, find_recordings, load_audio
+from wake.modelwrapper import ModelWrapper, NumpyModelWrapper, TFLiteModelWrapper, get_model_wrapper
+from wake.parameters import FileParams as FP
+
+KERAS_EPSILON = 1e-7  # Smallest standard deviation the Keras Normalization layer divides by
+MAX_PARITY_WINDOWS = 5000  # Most inputs used to compare the predictions, picked at random
+FLOAT_TOLERANCE = 1e-3  # Largest allowed difference from a float model (Keras or unquantized .tflite)
+# Largest allowed difference from a .tflite model with int8 weights. The dynamic range (hybrid)
+# quantized model also quantizes the activations while it runs, so it differs from the NumPy
+# model's float activations by up to about 0.02
+QUANTIZED_TOLERANCE = 0.03
+# The inputs must have predictions below LOW and above HIGH, so the check covers both classes
+LOW_PREDICTION = 0.1
+HIGH_PREDICTION = 0.9
+RANDOM_SEED = 0
+
+
+def export_keras_weights(model_path: str) -> dict:
+    """Reads the weights of a Keras checkpoint.
+    Returns:
+        dict of arrays in the layout `NumpyModelWrapper` expects
+    """
+    from tensorflow import keras
+    model = keras.models.load_model(model_path)
+    weights = {}
+    convs, denses = [], []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind == 'Normalization':
+            mean, variance = layer.mean.numpy(), layer.variance.numpy()
+            weights['norm_mean'] = mean.reshape(-1)
+            weights['norm_scale'] = 1 / np.maximum(np.sqrt(variance.reshape(-1)), KERAS_EPSILON)
+        elif kind == 'Conv1D':
+            convs.append(layer.get_weights())
+        elif kind == 'Dense':
+            denses.append(layer.get_weights())
+    return _collect_weights(weights, convs, denses)
+
+
+def export_tflite_weights(model_path: str) -> dict:
+    """Reads the weights of a TensorFlow Lite model, dequantizing int8 weights.
+    Returns:
+        dict of arrays in the layout `NumpyModelWrapper` expects
+    """
+    tflite = TFLiteModelWrapper._load_tensorflow_package(os.name != 'nt')
+    interpreter = tflite.Interpreter(model_path, experimental_preserve_all_tensors=True)
+    interpreter.allocate_tensors()
+    details = interpreter.get_tensor_details()
+
+    def constant(index: int) -> np.ndarray:
+        tensor = interpreter.get_tensor(index)
+        quantization = details[index]['quantization_parameters']
+        if tensor.dtype != np.int8:
+            return tensor.astype(np.float32)
+        # Per tensor or per channel scales along the quantized dimension
+        shape = [1] * tensor.ndim
+        shape[quantization['quantized_dimension']] = -1
+        scales = quantization['scales'].reshape(shape) if len(quantization['scales']) > 1 else quantization['scales']
+        zero_points = quantization['zero_points'].reshape(scales.shape) if len(quantization['zero_points']) > 1 else 0
+        return ((tensor.astype(np.float32) - zero_points) * scales).astype(np.float32)
+
+    n_mfcc = details[interpreter.get_input_details()[0]['index']]['shape'][-1]
+    weights = {'norm_mean': np.zeros(n_mfcc, dtype=np.float32), 'norm_scale': np.ones(n_mfcc, dtype=np.float32)}
+    convs, denses = [], []
+    try:
+        ops = interpreter._get_ops_details()  # Private, but the only way to find each layer's weights
+    except AttributeError:
+        raise RuntimeError('This version of the TensorFlow Lite interpreter does not list the model\'s '
+                           'operations (Interpreter._get_ops_details), so the weights can\'t be read. '
+                           'Export from the Keras checkpoint, or use tflite_runtime/tensorflow 2.5 or later')
+    for op in ops:
+        name, inputs = op['op_name'], op['inputs']
+        if name == 'SUB':
+            weights['norm_mean'] = constant(inputs[1]).reshape(-1)
+        elif name == 'MUL':
+            weights['norm_scale'] = constant(inputs[1]).reshape(-1)
+        elif name == 'DIV':
+            weights['norm_scale'] = 1 / constant(inputs[1]).reshape(-1)
+        elif name == 'CONV_2D':
+            # (filters, 1, kernel_size, in_channels) to (kernel_size, in_channels, filters)
+            kernel = constant(inputs[1])[:, 0].transpose(1, 2, 0)
+            convs.append([kernel, constant(inputs[2])])
+        elif name == 'FULLY_CONNECTED':
+            # (units, inputs) to (inputs, units)
+            denses.append([constant(inputs[1]).T, constant(inputs[2])])
+    return _collect_weights(weights, convs, denses)
+
+
+def _collect_weights(weights: dict, convs: list, denses: list) -> dict:
+    """Names the layer weights in order, checking the model has the expected layers."""
+    if len(convs) != 2 or len(denses) != 2:
+        raise ValueError(f'Expected 2 Conv1D and 2 Dense layers, found {len(convs)} and {len(denses)}')
+    for i, (kernel, bias) in enumerate(convs, start=1):
+        weights[f'conv{i}_kernel'], weights[f'conv{i}_bias'] = kernel, bias
+    for i, (kernel, bias) in enumerate(denses, start=1):
+        weights[f'dense{i}_kernel'], weights[f'dense{i}_bias'] = kernel, bias
+    return {name: np.asarray(w, dtype=np.float32) for name, w in weights.items()}
+
+
+def is_quantized(model_path: str) -> bool:
+    """Returns True if the model is a TensorFlow Lite model with int8 weights."""
+    if not model_path.endswith('.tflite'):
+        return False
+    tflite = TFLiteModelWrapper._load_tensorflow_package(os.name != 'nt')
+    interpreter = tflite.Interpreter(model_path)
+    return any(tensor['dtype'] == np.int8 for tensor in interpreter.get_tensor_details())
+
+
+def parity_inputs(paths: list[str], max_windows: int = MAX_PARITY_WINDOWS) -> np.ndarray:
+    """Loads real model inputs to compare the predictions on.
+    Args:
+        paths: .npy files of model inputs (like val_x.npy), and recordings or directories of them
+            (windows after each chunk, like the listener)
+        max_windows: most inputs to return, picked at random
+    Returns:
+        (n, n_features, n_mfcc) array of inputs
+    """
+    inputs = []
+    for path in paths:
+        if path.endswith('.npy'):
+            inputs.append(np.load(path, mmap_mode='r'))
+            continue
+        for recording in find_recordings([path]):
+            audio = load_audio(recording)
+            windows, indices = chunk_windows(calculate_mfccs(audio), len(audio))
+            inputs.append(windows[indices])
+    sizes = [len(x) for x in inputs]
+    if sum(sizes) == 0:
+        raise ValueError(f'No model inputs found in {paths}')
+    # Only the chosen inputs are copied, so a large val_x.npy isn't loaded whole
+    rng = np.random.default_rng(RANDOM_SEED)
+    chosen = np.sort(rng.choice(sum(sizes), min(max_windows, sum(sizes)), replace=False))
+    offsets = np.cumsum([0] + sizes)
+    return np.concatenate([x[chosen[(chosen >= first) & (chosen < first + len(x))] - first]
+                           for x, first in zip(inputs, offsets)]).astype(np.float32)
+
+
+def compare_models(reference: ModelWrapper, numpy_model: ModelWrapper, inputs: np.ndarray) -> tuple[float, np.ndarray]:
+    """Compares the two models' predictions.
+    Returns:
+        the largest difference between the predictions, and the reference model's predictions
+    """
+    expected = reference.predict_batch(inputs)
+    return float(np.max(np.abs(expected - numpy_model.predict_batch(inputs)))), expected
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model_path', help='Path to the .tflite model or Keras checkpoint')
+    parser.add_argument('-o', '--output', help='Path of the .npz file (defaults to the model path with .npz)')
+    parser.add_argument('-d', '--parity-data', nargs='+', default=[os.path.join(FP.data_dir, 'val_x.npy')],
+                        help='.npy files of model inputs, or recordings with the wake word (and without), '
+                             'to compare the predictions on (defaults to the validation set)')
+    args = parser.parse_args()
+
+    # Load the inputs first, so missing data fails before anything is written
+    inputs = parity_inputs(args.parity_data)
+
+    if args.model_path.endswith('.tflite'):
+        weights = export_tflite_weights(args.model_path)
+    else:
+        weights = export_keras_weights(args.model_path)
+    output = args.output or os.path.splitext(args.model_path.rstrip('/\\'))[0] + '.npz'
+    np.savez(output, **weights)
+    print(f'Saved weights to {output}')
+    for name, w in weights.items():
+        print(f'  {name:<16}{str(w.shape):>14}')
+
+    tolerance = QUANTIZED_TOLERANCE if is_quantized(args.model_path) else FLOAT_TOLERANCE
+    difference, expected = compare_models(get_model_wrapper(args.model_path), NumpyModelWrapper(output), inputs)
+    print(f'Predictions of the original model range from {expected.min():.3f} to {expected.max():.3f}, '
+          f'{np.mean(expected < LOW_PREDICTION):.0%} below {LOW_PREDICTION} '
+          f'and {np.mean(expected > HIGH_PREDICTION):.0%} above {HIGH_PREDICTION}')
+    print(f'Largest difference over {len(inputs)} predictions: {difference:.2e} '
+          f'({"OK" if difference < tolerance else "MISMATCH"}, tolerance {tolerance})')
+    if difference >= tolerance:
+        exit(1)
+    if expected.min() >= LOW_PREDICTION or expected.max() <= HIGH_PREDICTION:
+        print(f'The inputs need predictions below {LOW_PREDICTION} and above {HIGH_PREDICTION} to check '
+              f'the weights, add recordings with and without the wake word with --parity-data')
+        exit(1)
@@ -1 +1,3 @@
-from .wakelistener import WakeListener
\ No newline at end of file
+from .wakelistener import WakeListener
+from .multistreamlistener import MultiStreamListener
+from .keyword import Keyword
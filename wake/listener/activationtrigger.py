@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class ActivationTrigger:
     activation_ctr: int
     sensitivity: float
@@ -34,3 +37,71 @@ class ActivationTrigger:
             self.activation_ctr -= 1
         return False
 
+    def check_triggers(self, probs: np.ndarray) -> np.ndarray:
+        """Same as calling `check_trigger` on each probability in order, but faster.
+
+        Chunks below the sensitivity threshold only move the activation counter
+        towards 0 (and can't trigger), and within a run of consecutive activated
+        chunks the counter follows a fixed pattern, so each run and each gap
+        between runs is handled in one step instead of chunk by chunk.
+        Args:
+            probs: sequence of probabilities
+        Returns:
+            boolean array, True for each chunk where the trigger activated
+        """
+        probs = np.asarray(probs, dtype=np.float64)
+        if self.trigger_level < 0:
+            # Chunks that aren't activated can trigger, so the shortcuts don't apply
+            return np.array([self.check_trigger(p) for p in probs], dtype=bool)
+
+        triggered = np.zeros(len(probs), dtype=bool)
+        activated = (probs > 1.0 - self.sensitivity).astype(np.int8)
+        edges = np.diff(activated, prepend=0, append=0)
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+
+        ctr = self.activation_ctr
+        previous_end = 0
+        for start, end in zip(run_starts, run_ends):
+            ctr = self._skip_chunks(ctr, start - previous_end)
+            ctr = self._activated_run(ctr, start, end, triggered)
+            previous_end = end
+        self.activation_ctr = self._skip_chunks(ctr, len(probs) - previous_end)
+        return triggered
+
+    def _activated_run(self, ctr: int, start: int, end: int, triggered: np.ndarray) -> int:
+        """Marks the triggers in a run of activated chunks [start, end).
+        Returns:
+            the activation counter after the run
+        """
+        i = start
+        while ctr < 0 and i < end:
+            # An activation while waiting after a trigger restarts the wait
+            ctr = ctr + 1 if ctr + 1 == 0 else -self.activation_delay
+            i += 1
+            if ctr + 1 < 0:
+                return ctr  # Every other chunk in the run restarts the wait again
+        if i == end:
+            return ctr
+
+        # Count up until above the trigger level
+        first_trigger = i + self.trigger_level - ctr
+        if first_trigger >= end:
+            return ctr + end - i
+        if self.activation_delay >= 2:
+            # The rest of the run keeps restarting the wait
+            triggered[first_trigger] = True
+            return -self.activation_delay
+
+        # With a short delay the counter gets back to 0 and keeps triggering periodically
+        period = self.trigger_level + 1 + self.activation_delay
+        triggered[first_trigger:end:period] = True
+        last_trigger = first_trigger + (end - 1 - first_trigger) // period * period
+        return end - 1 - last_trigger - self.activation_delay
+
+    @staticmethod
+    def _skip_chunks(activation_ctr: int, chunks: int) -> int:
+        """Returns the activation counter after the given number of chunks that weren't activated."""
+        if activation_ctr < 0:
+            return min(activation_ctr + chunks, 0)
+        return max(activation_ctr - chunks, 0)
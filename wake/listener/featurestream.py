@@ -0,0 +1,105 @@
+import numpy as np
+
+from wake.mfcc import MfccCalculator, get_mfcc_calculator
+from wake.parameters import AudioParams, DEFAULT_AUDIO_PARAMS
+
+
+class FeatureStream:
+    """Incrementally converts streamed audio into the MFCC features input to the model.
+
+    Samples that don't fill a whole window yet are kept between calls, so only
+    the MFCCs for newly completed hops are calculated. The features and the
+    audio they were calculated from are stored in preallocated ring buffers so
+    nothing is reallocated for each chunk.
+    """
+    _samples: np.ndarray  # Audio that hasn't been used to calculate features yet
+    _start: int  # Index of the first unused sample in _samples
+    _end: int  # Index after the last unused sample in _samples
+    _features: np.ndarray  # Ring buffer of MFCC features (each row stored twice)
+    _feature_audio: np.ndarray  # Ring buffer of the hop of audio for each feature (stored twice)
+    _head: int  # Index of the oldest feature in the ring buffers
+
+    def __init__(self, ap: AudioParams = DEFAULT_AUDIO_PARAMS):
+        self._ap = ap
+        self._mfcc: MfccCalculator = get_mfcc_calculator(ap)
+        # Enough space for a partial window plus a few chunks before compacting
+        self._samples = np.zeros(2 * (ap.window_samples + ap.chunk_size))
+        self._start = 0
+        self._end = 0
+
+        # The ring buffers are twice as long as needed and every row is written
+        # at both i and i + n_features, so the most recent n_features rows are
+        # always a contiguous slice. Start with zeros (as if it was silent).
+        self._features = np.zeros((2 * ap.n_features, ap.n_mfcc))
+        self._feature_audio = np.zeros((2 * ap.n_features, ap.hop_samples))
+        self._head = 0
+
+    @property
+    def features(self) -> np.ndarray:
+        """View of the most recent `n_features` MFCCs, oldest first."""
+        return self._features[self._head:self._head + self._ap.n_features]
+
+    @property
+    def feature_audio(self) -> np.ndarray:
+        """View of the audio used to calculate the current features, oldest first."""
+        return self._feature_audio[self._head:self._head + self._ap.n_features].reshape(-1)
+
+    def update(self, data: bytes) -> np.ndarray:
+        """Adds a chunk of audio and calculates the features for any completed hops.
+        Args:
+            data: 16 bit little endian audio from the stream
+        Returns:
+            view of the most recent `n_features` MFCCs
+        """
+        audio = np.frombuffer(data, dtype='<i2')
+        added = 0
+        while added < len(audio):
+            added += self.add_audio(audio[added:])
+            self.calculate_new_features()
+        return self.features
+
+    def add_audio(self, audio: np.ndarray) -> int:
+        """Converts as much of the audio as fits into normalized samples.
+        Args:
+            audio: 16 bit audio samples
+        Returns:
+            the number of samples that were added
+        """
+        if self._end == len(self._samples):
+            # Move the unused samples back to the beginning of the buffer
+            unused = self._end - self._start
+            self._samples[:unused] = self._samples[self._start:self._end]
+            self._start, self._end = 0, unused
+
+        count = min(len(audio), len(self._samples) - self._end)
+        np.divide(audio[:count], 32768.0, out=self._samples[self._end:self._end + count])
+        self._end += count
+        return count
+
+    def calculate_new_features(self) -> None:
+        """Calculates the MFCCs of every completed window and adds them to the ring buffers."""
+        ap = self._ap
+        if self._end - self._start < ap.window_samples:
+            return
+
+        new_features = self._get_mfccs(self._samples[self._start:self._end])
+        for i, mfcc in enumerate(new_features):
+            # Save the hop of audio associated with the feature (to save audio files of activations)
+            audio_start = self._start + i * ap.hop_samples
+            hop_audio = self._samples[audio_start:audio_start + ap.hop_samples]
+            self._push(mfcc, hop_audio)
+
+        # Drop the samples that won't be part of any later window
+        self._start += len(new_features) * ap.hop_samples
+
+    def _push(self, mfcc: np.ndarray, hop_audio: np.ndarray) -> None:
+        """Overwrites the oldest feature in the ring buffers."""
+        n_features = self._ap.n_features
+        self._features[self._head] = mfcc
+        self._features[self._head + n_features] = mfcc
+        self._feature_audio[self._head] = hop_audio
+        self._feature_audio[self._head + n_features] = hop_audio
+        self._head = (self._head + 1) % n_features
+
+    def _get_mfccs(self, window_audio: np.ndarray) -> np.ndarray:
+        return self._mfcc.calculate(window_audio)
@@ -0,0 +1,44 @@
+import time
+from typing import Callable
+
+from wake.metrics import METRICS
+from wake.modelwrapper import ModelWrapper
+from .activationtrigger import ActivationTrigger
+
+
+class Keyword:
+    """A model listening for a keyword using the features shared by the `WakeListener`."""
+    name: str  # Name passed to the callback when the keyword is detected
+    model: ModelWrapper  # The model to use to make predictions on the features
+    trigger: ActivationTrigger  # Decides when the predictions are a detection
+    callback: Callable[[str], None]  # Called with the name when the keyword is detected
+    last_prediction: float  # The most recent prediction of the model
+
+    def __init__(self,
+                 name: str,
+                 model: ModelWrapper,
+                 callback: Callable[[str], None] = None,
+                 trigger: ActivationTrigger = None):
+        self.name = name
+        self.model = model
+        self.callback = callback
+        self.trigger = trigger if trigger is not None else ActivationTrigger()
+        self.last_prediction = 0.0
+        self._metric_name = f'keyword.{name}'
+
+    def check(self, features) -> bool:
+        """Predicts on the features and calls the callback if the keyword triggered.
+        Args:
+            features: the input features for the model
+        Returns:
+            True if the keyword was detected, False otherwise
+        """
+        start = time.perf_counter()
+        self.last_prediction = self.model.predict(features)
+        triggered = self.trigger.check_trigger(self.last_prediction)
+        METRICS.record(self._metric_name, time.perf_counter() - start)
+        if triggered:
+            METRICS.increment(f'{self._metric_name}.triggers')
+            if self.callback is not None:
+                self.callback(self.name)
+        return triggered
@@ -0,0 +1,93 @@
+import time
+import numpy as np
+
+from wake.metrics import METRICS
+from wake.parameters import AudioParams, FileParams, DEFAULT_AUDIO_PARAMS
+from wake.modelwrapper import ModelWrapper, get_model_wrapper
+from .wakelistener import WakeListener
+
+
+class MultiStreamListener:
+    """Listens for the wake word on several audio streams (one per microphone)
+    with a single model.
+
+    Each stream has its own `WakeListener`, so its features, silence gate,
+    trigger state and keywords are independent of the others. The model only
+    runs once per round of chunks though: the windows of every stream are
+    scored in one batched call, and only the predictions of the streams with
+    new (not silent) audio are used. The batch always has one row per stream,
+    so the TensorFlow Lite model's input isn't resized as streams go quiet.
+    """
+    listeners: list[WakeListener]  # The listener of each stream, in stream order
+    _model: ModelWrapper  # The model shared by every stream
+    _batch: np.ndarray  # Preallocated model input, row i is stream i's last window
+
+    def __init__(self,
+                 n_streams: int,
+                 model: ModelWrapper = None,
+                 ap: AudioParams = DEFAULT_AUDIO_PARAMS,
+                 use_silence_gate: bool = False):
+        """
+        Args:
+            n_streams: the number of audio streams
+            model: the model to use, loads the default model if None
+            ap: the audio parameters (the same for every stream)
+            use_silence_gate: if True, skips running the model for streams whose audio is silent
+        """
+        if model is None:
+            print(f'loading wake model from default path {FileParams.default_model_path}')
+            model = get_model_wrapper(FileParams.default_model_path)
+        self._model = model
+        self.listeners = [WakeListener(model=model, ap=ap, use_silence_gate=use_silence_gate)
+                          for _ in range(n_streams)]
+        self._batch = np.zeros((n_streams, ap.n_features, ap.n_mfcc), dtype=np.float32)
+
+    @property
+    def n_streams(self) -> int:
+        return len(self.listeners)
+
+    def swap_model(self, model: ModelWrapper) -> None:
+        """Replaces the model of every stream, can be called from another thread.
+        The model is read once per round of chunks, so each round uses either
+        the old or the new model.
+        """
+        self._model = model
+        for listener in self.listeners:
+            listener.swap_model(model)
+
+    def check_wake(self, chunks: list[bytes]) -> list[bool]:
+        """Checks each stream's next chunk for the wake word.
+        Args:
+            chunks: the next chunk of audio of each stream, None for streams without new audio
+        Returns:
+            for each stream, True if the wake word was detected, False otherwise
+        """
+        if len(chunks) != self.n_streams:
+            raise ValueError(f'Expected {self.n_streams} chunks, got {len(chunks)}')
+        pending = []  # Streams that need a prediction
+        for i, data in enumerate(chunks):
+            if data is None:
+                continue
+            mfccs = self.listeners[i].update_features(data)
+            if mfccs is not None:
+                self._batch[i] = mfccs
+                pending.append(i)
+
+        triggered = [False] * self.n_streams
+        if len(pending) == 0:
+            return triggered
+        start = time.perf_counter()
+        # The rows of streams without a new window are scored too (and ignored)
+        predictions = self._model.predict_batch(self._batch, self.n_streams)
+        METRICS.record('wake.inference_batch', time.perf_counter() - start)
+        METRICS.increment('wake.batched_predictions', len(pending))
+        for i in pending:
+            triggered[i] = self.listeners[i].handle_prediction(float(predictions[i]))
+        return triggered
+
+    def last_activation_audio(self, stream: int) -> bytes:
+        """Returns the audio of the stream's last wake word activation.
+        Raises:
+            Exception: if the stream has no activation to return
+        """
+        return self.listeners[stream].last_activation_audio()
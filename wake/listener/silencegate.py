@@ -0,0 +1,57 @@
+import audioop
+from math import ceil
+
+from wake.parameters import AudioParams, DEFAULT_AUDIO_PARAMS
+
+SILENCE_RMS = 100  # Chunks with a lower RMS volume are considered silent
+
+
+class SilenceGate:
+    """Decides when running the model can be skipped because its input is silent.
+
+    The model only needs to run while some of the audio in its input features
+    was loud. Once every chunk in the features has been quiet the prediction
+    would just be more silence, so the gate closes until the next loud chunk.
+    """
+    gated_chunks: int  # Number of chunks where the model was skipped
+    evaluated_chunks: int  # Number of chunks where the model was run
+
+    def __init__(self, ap: AudioParams = DEFAULT_AUDIO_PARAMS, rms_threshold: int = SILENCE_RMS):
+        """
+        Args:
+            ap: the audio parameters
+            rms_threshold: chunks with a lower RMS volume are considered silent
+        """
+        self.rms_threshold = rms_threshold
+        # Number of chunks a loud chunk can still affect the features (the
+        # feature window plus the partial window kept between chunks)
+        self.hold_chunks = ceil((ap.feature_samples + ap.window_samples) / ap.chunk_size) + 1
+        # The features start out as silence
+        self._quiet_chunks = self.hold_chunks
+        self.gated_chunks = 0
+        self.evaluated_chunks = 0
+
+    def is_silent(self, data: bytes) -> bool:
+        """Checks if the features are silent after adding the chunk.
+        Args:
+            data: the chunk of 16 bit audio added to the features
+        Returns:
+            True if the model can be skipped, False if it needs to run
+        """
+        if audioop.rms(data, 2) > self.rms_threshold:
+            self._quiet_chunks = 0
+        elif self._quiet_chunks <= self.hold_chunks:
+            self._quiet_chunks += 1
+
+        silent = self._quiet_chunks > self.hold_chunks
+        if silent:
+            self.gated_chunks += 1
+        else:
+            self.evaluated_chunks += 1
+        return silent
+
+    @property
+    def gated_fraction(self) -> float:
+        """Fraction of the chunks where the model was skipped."""
+        total = self.gated_chunks + self.evaluated_chunks
+        return self.gated_chunks / total if total > 0 else 0.0
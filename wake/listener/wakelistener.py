@@ -1,28 +1,37 @@
+import time
 import numpy as np
-from sonopy import mfcc_spec
 
+from wake.metrics import METRICS
 from wake.parameters import AudioParams, FileParams, DEFAULT_AUDIO_PARAMS
 from wake.modelwrapper import ModelWrapper, get_model_wrapper
 from .activationtrigger import ActivationTrigger
+from .featurestream import FeatureStream
+from .keyword import Keyword
+from .silencegate import SilenceGate
 
 
 class WakeListener:
-    audio_buffer: np.ndarray  # The audio data that is being processed
-    input_features: np.ndarray  # Feature matrix used for predictions
+    _features: FeatureStream  # Converts the incoming audio into features for predictions
+    silence_gate: SilenceGate  # Skips predictions while the input is silent (None if disabled)
 
     _model: ModelWrapper  # The model to use to make predictions on the audio
+    keywords: list[Keyword]  # Other keywords listened for using the same features
 
     def __init__(self,
                  model: ModelWrapper = None,
-                 ap: AudioParams = DEFAULT_AUDIO_PARAMS):
+                 ap: AudioParams = DEFAULT_AUDIO_PARAMS,
+                 use_silence_gate: bool = False):
+        """
+        Args:
+            model: the model to use, loads the default model if None
+            ap: the audio parameters
+            use_silence_gate: if True, skips running the model while the audio is silent
+        """
         self.trigger = ActivationTrigger()
-        # Initialize the audio window to empty
-        self.audio_buffer = np.array([])
-        # Initialize the feature matrix to zeros (as if it was silent)
-        self.input_features = np.zeros((ap.n_features, ap.n_mfcc))
-        # Initialize the audio associated with the features to zeros (aka silence)
-        self.feature_audio = np.zeros((ap.n_features * ap.hop_samples))
+        self._features = FeatureStream(ap)
+        self.silence_gate = SilenceGate(ap) if use_silence_gate else None
 
+        self.keywords = []
         self._last_activation_audio = None
         self._ap = ap
         if model is not None:
@@ -38,56 +47,75 @@ class WakeListener:
         Returns:
             True if the data is the wake word, False otherwise
         """
-        mfccs = self._get_features(data)
+        mfccs = self.update_features(data)
+        if mfccs is None:
+            return False
+        start = time.perf_counter()
         prediction: float = self._model.predict(mfccs)
-        print(f'prediction: {round(prediction, 5):>10}', end='\r')
-        triggered = self.trigger.check_trigger(prediction)
-        if triggered:
-            self._last_activation_audio = self.feature_audio
-        return triggered
+        METRICS.record('wake.inference', time.perf_counter() - start)
+        return self.handle_prediction(prediction)
 
-    def _get_features(self, buffer: bytes) -> np.ndarray:
-        """Converts the audio buffer into MFCC features.
+    def swap_model(self, model: ModelWrapper) -> None:
+        """Replaces the wake word model, can be called from another thread.
+        `check_wake` reads the model once per chunk, so each chunk uses either
+        the old or the new model.
+        """
+        self._model = model
+
+    def update_features(self, data: bytes) -> np.ndarray:
+        """Adds the chunk of audio to the features, the first half of `check_wake`.
         Args:
-            buffer: the audio buffer
+            data: the audio data to add
         Returns:
-            the MFCC features
+            the features to predict on, or None if the chunk was skipped by the silence gate
         """
-        # Convert the buffer to a normalized numpy array
-        np_audio = np.fromstring(buffer, dtype='<i2').astype(np.float32, order='C') / 32768.0
-        self.audio_buffer = np.concatenate((self.audio_buffer, np_audio))
-
-        # If there are enough samples, extract new MFCC features
-        if len(self.audio_buffer) >= self._ap.window_samples:
-            # Convert audio into MFCC features
-            new_features = self._get_mfccs(self.audio_buffer)
-
-            # The number of audio frames used to create the new_features
-            audio_frames_used: int = len(new_features) * self._ap.hop_samples
-
-            # Save the audio associated with the new features (to save audio files of activations)
-            new_features_audio: np.ndarray = self.audio_buffer[:audio_frames_used]
-            self.feature_audio = np.concatenate((self.feature_audio[audio_frames_used:], new_features_audio))
-
-            # Remove the samples that were used to create the new_features
-            self.audio_buffer = self.audio_buffer[audio_frames_used:]
-
-            # Make sure the new_features will fit in the model
-            if len(new_features) > len(self.input_features):
-                new_features = new_features[-len(self.input_features):]
+        start = time.perf_counter()
+        mfccs = self._features.update(data)
+        METRICS.record('wake.features', time.perf_counter() - start)
+        METRICS.increment('wake.chunks')
+        if self.silence_gate is not None and self.silence_gate.is_silent(data):
+            # Nothing to detect, hold the trigger state until there's sound
+            METRICS.increment('wake.gated')
+            return None
+        return mfccs
+
+    def handle_prediction(self, prediction: float) -> bool:
+        """Updates the trigger with the model's prediction for the latest features,
+        the second half of `check_wake`.
+        Args:
+            prediction: the wake word probability
+        Returns:
+            True if the wake word was detected, False otherwise
+        """
+        METRICS.status.update(lambda: f'prediction: {round(float(prediction), 5):>10}')
+        start = time.perf_counter()
+        triggered = self.trigger.check_trigger(prediction)
+        METRICS.record('wake.trigger', time.perf_counter() - start)
+        if triggered:
+            METRICS.increment('wake.triggers')
+            # Copy since the ring buffer is overwritten by the following chunks
+            self._last_activation_audio = self._features.feature_audio.copy()
 
-            # Add the new features to the end of the existing features
-            self.input_features = np.concatenate((self.input_features[len(new_features):], new_features))
+        # The other keywords only cost one more prediction each
+        for keyword in self.keywords:
+            keyword.check(self._features.features)
+        return triggered
 
-        return self.input_features
+    def add_keyword(self, keyword: Keyword) -> None:
+        """Listens for another keyword using the same features as the wake word.
+        The keyword's callback is called when it's detected.
+        Args:
+            keyword: the keyword to add
+        Raises:
+            ValueError: if a keyword with the same name was already added
+        """
+        if any(k.name == keyword.name for k in self.keywords):
+            raise ValueError(f'Already listening for keyword {keyword.name}')
+        self.keywords.append(keyword)
 
-    def _get_mfccs(self, window_audio: np.ndarray):
-        return mfcc_spec(audio=window_audio,
-                         sample_rate=self._ap.sample_rate,
-                         window_stride=(self._ap.window_samples, self._ap.hop_samples),
-                         num_filt=self._ap.n_filt,
-                         fft_size=self._ap.n_fft,
-                         num_coeffs=self._ap.n_mfcc)
+    def remove_keyword(self, name: str) -> None:
+        """Stops listening for the keyword with the given name."""
+        self.keywords = [k for k in self.keywords if k.name != name]
 
     def last_activation_audio(self) -> bytes:
         """Returns the audio corresponding to the last wake word activation.
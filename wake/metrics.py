@@ -0,0 +1,179 @@
+"""
+Low overhead counters and latency histograms for the assistant's hot paths.
+
+Everything records into the shared `METRICS` instance, which other tools can
+poll with `METRICS.snapshot()` instead of reading a line printed every chunk,
+or read from the file `METRICS.start_saving` keeps up to date.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable
+
+# Upper bounds of the histogram buckets in milliseconds (the last bucket has no upper bound)
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Counts latencies in fixed buckets, so recording never allocates."""
+    counts: list[int]  # Number of latencies in each bucket
+    count: int  # Total number of latencies recorded
+    total_ms: float  # Sum of all latencies
+    max_ms: float  # Largest latency recorded
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Adds a latency to the histogram."""
+        ms = seconds * 1000
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p: float) -> float:
+        """Estimates the latency percentile (ms) as the upper bound of its bucket (or the max if lower)."""
+        if self.count == 0:
+            return None
+        target = self.count * p / 100
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target and bucket_count > 0:
+                return min(BUCKETS_MS[i], self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count > 0 else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms,
+            'buckets': self.counts.copy(),
+        }
+
+
+class StatusLine:
+    """Prints a single updating status line at most once per interval."""
+
+    def __init__(self, interval: float = None):
+        """
+        Args:
+            interval: minimum seconds between prints, None to never print
+        """
+        self.interval = interval
+        self._last_print = 0.0
+
+    def update(self, text: Callable[[], str]) -> None:
+        """Prints the status if the interval passed.
+        Args:
+            text: function returning the status (only called when printing)
+        """
+        if self.interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_print >= self.interval:
+            self._last_print = now
+            print(f'{text():<80}', end='\r')
+
+
+class Metrics:
+    """Registry of named counters, gauges and latency histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Metrics are recorded from several threads
+        self._counters: dict[str, int] = {}
+        self._gauges: dict[str, float] = {}
+        self._histograms: dict[str, Histogram] = {}
+        self.status = StatusLine()
+        self._start_time = time.time()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Adds to a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Sets a value that can go up and down (like a queue length)."""
+        self._gauges[name] = value
+
+    def record(self, name: str, seconds: float) -> None:
+        """Records a latency in the named histogram."""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def time(self, name: str):
+        """Context manager that records how long the block took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def histogram(self, name: str) -> Histogram:
+        """Returns the named histogram (None if nothing was recorded)."""
+        return self._histograms.get(name)
+
+    def snapshot(self) -> dict:
+        """Returns a copy of all the metrics."""
+        with self._lock:
+            return {
+                'time': time.time(),
+                'uptime_s': time.time() - self._start_time,
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'latencies': {name: h.snapshot() for name, h in self._histograms.items()},
+            }
+
+    def save(self, path: str) -> None:
+        """Writes a snapshot of the metrics to a JSON file."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Replace the file in one step, so a reader never sees a partial file
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temp_path, path)
+
+    def start_saving(self, path: str, interval: float) -> None:
+        """Saves the metrics to a JSON file every `interval` seconds, and when the program exits."""
+        def save():
+            try:
+                self.save(path)
+            except OSError as e:
+                print(f'Could not save the metrics to {path}: {e}')
+
+        def save_periodically():
+            while True:
+                time.sleep(interval)
+                save()
+        atexit.register(save)
+        threading.Thread(target=save_periodically, daemon=True).start()
+
+    def summary(self) -> str:
+        """Describes the latency percentiles and counters on a few lines."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, h in sorted(snapshot['latencies'].items()):
+            lines.append(f'{name:<20} n={h["count"]:<8} p50={h["p50_ms"]:.3g}ms p95={h["p95_ms"]:.3g}ms '
+                         f'p99={h["p99_ms"]:.3g}ms max={h["max_ms"]:.3g}ms')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{name:<20} {value}')
+        return '\n'.join(lines)
+
+
+METRICS = Metrics()  # Shared by the whole assistant
@@ -0,0 +1,139 @@
+"""
+Vectorized MFCC calculation shared by the live listener and the preprocessing.
+
+Produces the same features as sonopy's `mfcc_spec` (which the model was trained
+with), but the filterbank and DCT matrices are only built once per set of audio
+parameters and all the frames of a signal are calculated with one batched FFT
+and matrix multiplications.
+"""
+from functools import lru_cache
+import numpy as np
+
+EPSILON = np.finfo(float).eps  # Smallest value passed to the log
+
+
+class MfccCalculator:
+    """Calculates MFCCs using matrices precomputed from the audio parameters."""
+
+    def __init__(self, audio_params):
+        """Precomputes the matrices used for the MFCC calculation.
+        Args:
+            audio_params: `parameters.AudioParams` the audio parameters
+        """
+        self.window_samples = audio_params.window_samples
+        self.hop_samples = audio_params.hop_samples
+        self.n_fft = audio_params.n_fft
+        self.n_mfcc = min(audio_params.n_mfcc, audio_params.n_filt)
+        # Like sonopy, no window function is applied and the FFT only uses the
+        # first n_fft samples of each window (or zero pads it)
+        self.fft_samples = min(self.window_samples, self.n_fft)
+        n_bins = self.n_fft // 2 + 1
+        self.filterbank_t = filterbanks(audio_params.sample_rate, audio_params.n_filt, n_bins).T
+        self.dct_matrix = dct_matrix(audio_params.n_filt, self.n_mfcc)
+
+    def n_frames(self, n_samples: int) -> int:
+        """The number of MFCC frames that fit in the given number of samples."""
+        if n_samples < self.window_samples:
+            return 0
+        return (n_samples - self.window_samples) // self.hop_samples + 1
+
+    def frames(self, audio: np.ndarray) -> np.ndarray:
+        """Splits the audio into a (n_frames, fft_samples) view of overlapping frames without copying."""
+        n_frames = self.n_frames(len(audio))
+        stride = audio.strides[0]
+        return np.lib.stride_tricks.as_strided(audio,
+                                               shape=(n_frames, self.fft_samples),
+                                               strides=(self.hop_samples * stride, stride),
+                                               writeable=False)
+
+    def calculate(self, audio: np.ndarray) -> np.ndarray:
+        """Calculates the MFCCs for every complete window in the audio.
+        Args:
+            audio: the normalized audio samples
+        Returns:
+            (n_frames, n_mfcc) array of MFCCs
+        """
+        audio = np.asarray(audio, dtype=np.float64)
+        if self.n_frames(len(audio)) == 0:
+            return np.empty((0, self.n_mfcc))
+        return self.calculate_frames(self.frames(audio))
+
+    def calculate_frames(self, frames: np.ndarray) -> np.ndarray:
+        """Calculates the MFCCs of frames that were already split from the audio.
+        Args:
+            frames: (n_frames, fft_samples) array of audio frames
+        Returns:
+            (n_frames, n_mfcc) array of MFCCs
+        """
+        fft = np.fft.rfft(frames, n=self.n_fft)
+        powers = (fft.real ** 2 + fft.imag ** 2) / self.n_fft
+        mels = _safe_log(powers @ self.filterbank_t)
+        mfccs = mels @ self.dct_matrix
+        # Replace the first coefficient with the log energy
+        mfccs[:, 0] = _safe_log(powers.sum(axis=1))
+        return mfccs
+
+
+@lru_cache()
+def get_mfcc_calculator(audio_params) -> MfccCalculator:
+    """Returns the `MfccCalculator` for the audio parameters, creating it the first time."""
+    return MfccCalculator(audio_params)
+
+
+def filterbanks(sample_rate: int, n_filt: int, n_bins: int) -> np.ndarray:
+    """Makes a set of triangle filters focused on mel-spaced frequencies.
+
+    Uses the same (integer) grid as sonopy so the features match the ones the
+    model was trained on.
+    Args:
+        sample_rate: the sample rate (Hz) of the audio
+        n_filt: the number of filters
+        n_bins: the number of frequency bins in the power spectrum
+    Returns:
+        (n_filt, n_bins) array of filters
+    """
+    def hertz_to_mels(f):
+        return 1127. * np.log(1. + f / 700.)
+
+    def mel_to_hertz(mel):
+        return 700. * (np.exp(mel / 1127.) - 1.)
+
+    # Grid contains the left, center and right points of the filter triangles
+    grid_mels = np.linspace(hertz_to_mels(0), hertz_to_mels(sample_rate), n_filt + 2, True)
+    grid_indices = (mel_to_hertz(grid_mels) * n_bins / sample_rate).astype(int)
+
+    # Push forward duplicate points to prevent useless filters
+    offset = 0
+    previous = grid_indices[0] - 1
+    corrected = []
+    for i in grid_indices:
+        offset = max(0, offset + previous + 1 - i)
+        corrected.append(i + offset)
+        previous = i
+
+    banks = np.zeros((n_filt, n_bins))
+    for i in range(n_filt):
+        left, middle, right = corrected[i:i + 3]
+        banks[i, left:middle] = np.linspace(0., 1., middle - left, False)
+        banks[i, middle:right] = np.linspace(1., 0., right - middle, False)
+    return banks
+
+
+def dct_matrix(n_filt: int, n_mfcc: int) -> np.ndarray:
+    """Makes the matrix for an orthonormal type II DCT keeping the first n_mfcc coefficients.
+    Args:
+        n_filt: the number of mel filters (input size)
+        n_mfcc: the number of coefficients to keep
+    Returns:
+        (n_filt, n_mfcc) array so that `mels @ matrix` is the DCT of each row
+    """
+    n = np.arange(n_filt)[:, np.newaxis]
+    k = np.arange(n_mfcc)[np.newaxis, :]
+    matrix = np.cos(np.pi * k * (2 * n + 1) / (2 * n_filt)) * np.sqrt(2 / n_filt)
+    matrix[:, 0] /= np.sqrt(2)
+    return matrix
+
+
+def _safe_log(x: np.ndarray) -> np.ndarray:
+    """Prevents errors on log(0) or log of negative values."""
+    return np.log(np.clip(x, EPSILON, None))
@@ -0,0 +1,111 @@
+"""Reloads the wake word model when its file changes, without restarting the assistant."""
+import os
+import threading
+import time
+from typing import Callable
+import numpy as np
+
+from wake.metrics import METRICS
+from wake.modelwrapper import ModelWrapper, get_model_wrapper
+from wake.parameters import AudioParams, DEFAULT_AUDIO_PARAMS
+
+POLL_T = 5  # Seconds between checks of the model file
+WARMUP_PREDICTIONS = 3  # Predictions run on a new model before it's used
+
+
+class ModelWatcher:
+    """Watches the model file on a background thread and hands over new models.
+
+    A changed file is only loaded once it has stopped changing for one poll (so
+    a model that's still being copied isn't read), then it's loaded and warmed
+    up on the watcher's thread so the listener never waits for it. If loading
+    or warming up fails the old model is kept and the file is retried when it
+    changes again.
+    """
+    model_path: str  # Path of the model file to watch
+    reloads: int  # Number of models handed over
+    failures: int  # Number of new model files that couldn't be used
+
+    def __init__(self,
+                 model_path: str,
+                 on_model: Callable[[ModelWrapper], None],
+                 ap: AudioParams = DEFAULT_AUDIO_PARAMS,
+                 poll_t: float = POLL_T):
+        """
+        Args:
+            model_path: path of the model file to watch
+            on_model: called with each new model once it's warmed up (like `WakeListener.swap_model`)
+            ap: the audio parameters, used to make the warm-up input
+            poll_t: seconds between checks of the model file
+        """
+        self.model_path = model_path
+        self.reloads = 0
+        self.failures = 0
+        self._on_model = on_model
+        self._warmup_input = np.zeros((ap.n_features, ap.n_mfcc), dtype=np.float32)
+        self._poll_t = poll_t
+        self._loaded_stat = self._file_stat()  # The file the current model was loaded from
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Starts watching the model file."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops watching the model file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self, previous_stat: tuple = None) -> tuple:
+        """Reloads the model if the file changed and has stopped changing.
+        Args:
+            previous_stat: the file's stat from the previous check
+        Returns:
+            the file's current stat, to pass to the next check
+        """
+        stat = self._file_stat()
+        if stat is not None and stat != self._loaded_stat and stat == previous_stat:
+            self._loaded_stat = stat  # Don't retry a broken file until it changes again
+            self._reload()
+        return stat
+
+    def _watch(self) -> None:
+        stat = self._loaded_stat
+        while not self._stop.wait(self._poll_t):
+            stat = self.check(stat)
+
+    def _reload(self) -> None:
+        """Loads and warms up the new model, keeping the old one if anything fails."""
+        start = time.perf_counter()
+        try:
+            model = get_model_wrapper(self.model_path)
+            loaded = time.perf_counter()
+            for _ in range(WARMUP_PREDICTIONS):
+                prediction = model.predict(self._warmup_input)
+            if not 0.0 <= prediction <= 1.0:
+                raise ValueError(f'Warm-up prediction out of range: {prediction}')
+        except Exception as e:
+            self.failures += 1
+            METRICS.increment('model.reload_failures')
+            print(f'Could not load new model {self.model_path}, keeping the old one: {e}')
+            return
+        warmed_up = time.perf_counter()
+        self._on_model(model)
+        self.reloads += 1
+        METRICS.increment('model.reloads')
+        METRICS.record('model.warmup', warmed_up - loaded)
+        print(f'Loaded new model {self.model_path} in {(loaded - start) * 1000:.1f} ms, '
+              f'warm-up took {(warmed_up - loaded) * 1000:.1f} ms')
+
+    def _file_stat(self) -> tuple:
+        """Returns the file's modification time and size, or None if it doesn't exist."""
+        try:
+            stat = os.stat(self.model_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
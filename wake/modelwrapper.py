@@ -1,5 +1,7 @@
 import numpy as np
 
+DEFAULT_BATCH_SIZE = 256  # Maximum number of inputs to predict at once in `predict_batch`
+
 
 class ModelWrapper:
     """Wrapper around the model to make it easier to use different models for 
@@ -15,6 +17,16 @@ class ModelWrapper:
         """
         raise NotImplementedError()
 
+    def predict_batch(self, inputs: np.ndarray, batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        """Predicts if each of the inputs corresponds to the wake word.
+        Args:
+            inputs: array of inputs to the model, stacked along the first axis
+            batch_size: the maximum number of inputs to predict at once
+        Returns:
+            array with the prediction (between 0 and 1) for each input
+        """
+        return np.array([self.predict(input) for input in inputs], dtype=np.float32)
+
 
 class KerasModelWrapper(ModelWrapper):
     """Predictor for a keras model"""
@@ -28,28 +40,67 @@ class KerasModelWrapper(ModelWrapper):
     def predict(self, input_data) -> float:
         return self._model.predict(input_data[np.newaxis], verbose=0)[0][0]
 
+    def predict_batch(self, inputs: np.ndarray, batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        return self._model.predict(inputs, batch_size=batch_size, verbose=0)[:, 0]
+
 
 class TFLiteModelWrapper(ModelWrapper):
     """Predictor for a tensorflow lite model"""
 
-    def __init__(self, model_path: str, on_pi: bool):
+    def __init__(self, model_path: str, on_pi: bool, num_threads: int = None, use_xnnpack: bool = True):
+        """
+        Args:
+            model_path: path to the .tflite model
+            on_pi: if running on a raspberry pi (uses the tflite runtime)
+            num_threads: number of threads the interpreter can use, None for the default
+            use_xnnpack: if False, disables the XNNPACK delegate that's applied by default
+        """
         # Load the tensorflow package depending on the platform
         tflite = TFLiteModelWrapper._load_tensorflow_package(on_pi)
-        self._interpreter = tflite.Interpreter(model_path)
+        options = {}
+        if not use_xnnpack:
+            op_resolver_type = tflite.OpResolverType if on_pi else tflite.experimental.OpResolverType
+            options['experimental_op_resolver_type'] = op_resolver_type.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        self._interpreter = tflite.Interpreter(model_path, num_threads=num_threads, **options)
         self._interpreter.allocate_tensors()
-        self._input_index = self._interpreter.get_input_details()[0]['index']
+        input_details = self._interpreter.get_input_details()[0]
+        self._input_index = input_details['index']
         self._output_index = self._interpreter.get_output_details()[0]['index']
+        self._input_shape = tuple(input_details['shape'][1:])  # Shape of a single input
+        self._batch_size = input_details['shape'][0]  # Batch size the tensors are allocated for
+        # Functions returning views of the interpreter's tensors (the views must
+        # not be held while invoking the interpreter)
+        self._input_tensor = self._interpreter.tensor(self._input_index)
+        self._output_tensor = self._interpreter.tensor(self._output_index)
 
     def predict(self, input) -> float:
-        # Plug the input into the interpreter
-        self._interpreter.set_tensor(self._input_index, input.astype(np.float32)[np.newaxis])
+        self._resize(1)
+        # Write the input directly into the interpreter's input tensor
+        self._input_tensor()[0] = input
 
         # Predict using the interpreter
         self._interpreter.invoke()
 
         # Get and return the result
-        output_data = self._interpreter.get_tensor(self._output_index)
-        return output_data[0][0]
+        return float(self._output_tensor()[0][0])
+
+    def predict_batch(self, inputs: np.ndarray, batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        predictions = np.empty(len(inputs), dtype=np.float32)
+        for start in range(0, len(inputs), batch_size):
+            batch = inputs[start:start + batch_size]
+            self._resize(len(batch))
+            self._input_tensor()[:] = batch
+            self._interpreter.invoke()
+            predictions[start:start + len(batch)] = self._output_tensor()[:, 0]
+        return predictions
+
+    def _resize(self, batch_size: int) -> None:
+        """Resizes the input tensor to hold the given number of inputs."""
+        if batch_size == self._batch_size:
+            return
+        self._interpreter.resize_tensor_input(self._input_index, (batch_size,) + self._input_shape)
+        self._interpreter.allocate_tensors()
+        self._batch_size = batch_size
 
     @staticmethod
     def _load_tensorflow_package(on_pi: bool):
@@ -65,15 +116,79 @@ class TFLiteModelWrapper(ModelWrapper):
         return tflite
 
 
-def get_model_wrapper(model_path: str) -> ModelWrapper:
-    """Returns a `ModelWrapper` based on the model file type."""
+class NumpyModelWrapper(ModelWrapper):
+    """Predictor that runs the wake word network in NumPy, without tensorflow.
+
+    Runs the architecture from `train.ipynb` (normalization, two ReLU Conv1D
+    layers, max pooling, flatten, a ReLU dense layer and a sigmoid output) with
+    weights exported by `export_weights.py`. The number of filters and units
+    come from the weights, so the smaller variants of the model work too.
+    """
+
+    def __init__(self, weights_path: str):
+        """
+        Args:
+            weights_path: path to the .npz weights saved by `export_weights.py`
+        """
+        weights = np.load(weights_path)
+        self._mean = weights['norm_mean'].astype(np.float32)
+        self._scale = weights['norm_scale'].astype(np.float32)
+        # Conv1D kernels are (kernel_size, in_channels, filters)
+        self._convs = [(weights[f'conv{i}_kernel'].astype(np.float32), weights[f'conv{i}_bias'].astype(np.float32))
+                       for i in (1, 2)]
+        # Dense kernels are (inputs, units)
+        self._dense1 = weights['dense1_kernel'].astype(np.float32), weights['dense1_bias'].astype(np.float32)
+        self._dense2 = weights['dense2_kernel'].astype(np.float32), weights['dense2_bias'].astype(np.float32)
+        print('Using NumPy model')
+
+    def predict(self, input) -> float:
+        return float(self._forward(np.asarray(input, dtype=np.float32)[np.newaxis])[0])
+
+    def predict_batch(self, inputs: np.ndarray, batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        predictions = np.empty(len(inputs), dtype=np.float32)
+        for start in range(0, len(inputs), batch_size):
+            batch = np.asarray(inputs[start:start + batch_size], dtype=np.float32)
+            predictions[start:start + len(batch)] = self._forward(batch)
+        return predictions
+
+    def _forward(self, x: np.ndarray) -> np.ndarray:
+        """Runs the network on a (batch, n_features, n_mfcc) array.
+        Returns:
+            the prediction for each input
+        """
+        x = (x - self._mean) * self._scale
+        for kernel, bias in self._convs:
+            # Valid convolution as one matrix multiply per kernel tap
+            n = x.shape[1] - len(kernel) + 1
+            out = x[:, :n] @ kernel[0]
+            for i in range(1, len(kernel)):
+                out += x[:, i:i + n] @ kernel[i]
+            x = np.maximum(out + bias, 0)
+        # Max pooling with a pool size and stride of 2 (drops an odd last step)
+        n = x.shape[1] // 2
+        x = x[:, :2 * n].reshape(len(x), n, 2, x.shape[2]).max(axis=2)
+        x = x.reshape(len(x), -1)
+        x = np.maximum(x @ self._dense1[0] + self._dense1[1], 0)
+        logits = (x @ self._dense2[0] + self._dense2[1])[:, 0]
+        return 0.5 * (1 + np.tanh(0.5 * logits))  # Sigmoid that can't overflow
+
+
+def get_model_wrapper(model_path: str, num_threads: int = None, use_xnnpack: bool = True) -> ModelWrapper:
+    """Returns a `ModelWrapper` based on the model file type (.tflite, .npz weights, or a Keras checkpoint).
+    Args:
+        model_path: path to the model
+        num_threads: number of threads for tensorflow lite models, None for the default
+        use_xnnpack: if tensorflow lite models use the XNNPACK delegate
+    """
     import os
     running_on_pi = os.name != 'nt'
 
     if not os.path.exists(model_path):
         raise FileNotFoundError(f'Could not find model: {model_path}')
     if model_path.endswith('.tflite'):
-        return TFLiteModelWrapper(model_path, running_on_pi)
+        return TFLiteModelWrapper(model_path, running_on_pi, num_threads, use_xnnpack)
+    elif model_path.endswith('.npz'):
+        return NumpyModelWrapper(model_path)
     else:
         assert (
             not running_on_pi), f'Cannot use Keras model on raspberry pi: {model_path}.\nPlease convert the model to a tensorflow lite model.'
@@ -2,9 +2,9 @@
 Functions to convert raw audio to MFCC data including data augmentation
 """
 from enum import Enum
-from sonopy import mfcc_spec as sonopy_mfcc_spec
 import numpy as np
 
+from mfcc import get_mfcc_calculator
 from parameters import AudioParams
 from .spec_augmentation import spec_augment
 from .waveform_augmentation import *
@@ -119,11 +119,4 @@ def calculate_mfcc(audio: np.ndarray, ap: AudioParams):
     Returns:
         MFCC data
     """
-    return sonopy_mfcc_spec(
-        audio=audio,
-        sample_rate=ap.sample_rate,
-        window_stride=(ap.window_samples, ap.hop_samples),
-        num_filt=ap.n_filt,
-        fft_size=ap.n_fft,
-        num_coeffs=ap.n_mfcc
-    )
+    return get_mfcc_calculator(ap).calculate(audio)
@@ -3,21 +3,27 @@ import time
 import audio_collection, listener
 from parameters import DEFAULT_AUDIO_PARAMS as AP
 from modelwrapper import get_model_wrapper
+from wake.metrics import METRICS  # Same instance the listener records into
+from wake.modelwatcher import ModelWatcher
 
 # MODEL_PATH = './checkpoints/smaller_cnn'
 MODEL_PATH = './trained_model.tflite'
 
 model = get_model_wrapper(MODEL_PATH)
-p, stream = audio_collection.utils.create_stream(audio_params=AP)
-wake_listener = listener.WakeListener(model=model, ap=AP)
+capture = audio_collection.AudioCapture(AP)
+wake_listener = listener.WakeListener(model=model, ap=AP, use_silence_gate=True)
+model_watcher = ModelWatcher(MODEL_PATH, wake_listener.swap_model)
 
+METRICS.status.interval = 0.5  # Show the latest prediction twice a second
 continue_listening = True
 
 def thread_function():
     """Continuously passes audio data to the wake word listener."""
     print('Thread started...')
     while continue_listening:
-        data = stream.read(AP.chunk_size, False)
+        data = capture.read(timeout=1)
+        if data is None:
+            continue
         triggered = wake_listener.check_wake(data)
         if triggered:
             print('WAKE!!!' + " " * 100)
@@ -28,6 +34,8 @@ thread = threading.Thread(target=thread_function, daemon=True)
 try:
     print('\n\nPress enter to quit.\n\n')
     time.sleep(1)
+    capture.start()
+    model_watcher.start()
     thread.start()
     text = input()  # Wait for user to press enter
     continue_listening = False  # Stop the thread
@@ -36,6 +44,8 @@ try:
 except Exception as e:
     print(e)
 
+model_watcher.stop()
 print('closing stream...')
-stream.close()
-p.terminate()
+print(capture.stats())
+print(METRICS.summary())
+capture.stop()
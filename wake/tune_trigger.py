@@ -0,0 +1,111 @@
+"""
+Tunes the `ActivationTrigger` parameters over cached model predictions.
+
+Loads the predictions saved by `evaluate_recordings --save-predictions` and
+sweeps the sensitivity, trigger level and activation delay (a full grid, or
+random samples of it), measuring the false accepts per hour and the false
+reject rate of each combination. Prints the DET trade-off curve (the
+combinations that aren't beaten on both metrics by another one) and can save
+every result as CSV.
+
+Run from the repository root:
+    python -m wake.tune_trigger predictions.npz [--random N] [--output results.csv]
+"""
+import argparse
+import csv
+import itertools
+import time
+import numpy as np
+
+from wake.listener.activationtrigger import ActivationTrigger
+
+SENSITIVITIES = np.round(np.arange(0.1, 1.0, 0.1), 2)
+TRIGGER_LEVELS = range(0, 7)
+ACTIVATION_DELAYS = range(0, 21, 4)
+RANDOM_SEED = 0
+
+
+def load_predictions(path: str) -> tuple[list[np.ndarray], np.ndarray, np.ndarray]:
+    """Loads the cached predictions.
+    Returns:
+        the predictions of each file, if each file is positive, and the duration of each file in seconds
+    """
+    data = np.load(path)
+    predictions = [data[f'predictions_{i}'] for i in range(len(data['paths']))]
+    return predictions, data['positive'], data['durations']
+
+
+def evaluate_parameters(predictions: list[np.ndarray], positive: np.ndarray, durations: np.ndarray,
+                        sensitivity: float, trigger_level: int, activation_delay: int) -> dict:
+    """Replays the trigger with the given parameters over every file.
+    Returns:
+        dict with the parameters, false accepts per hour and false reject rate
+    """
+    false_accepts = 0
+    missed = 0
+    for file_predictions, is_positive in zip(predictions, positive):
+        trigger = ActivationTrigger(sensitivity, trigger_level, activation_delay)
+        triggers = np.count_nonzero(trigger.check_triggers(file_predictions))
+        if is_positive:
+            missed += triggers == 0
+        else:
+            false_accepts += triggers
+    negative_hours = durations[~positive].sum() / 3600
+    n_positive = np.count_nonzero(positive)
+    return {
+        'sensitivity': sensitivity,
+        'trigger_level': trigger_level,
+        'activation_delay': activation_delay,
+        'false_accepts_per_hour': false_accepts / negative_hours if negative_hours > 0 else 0.0,
+        'false_reject_rate': missed / n_positive if n_positive > 0 else 0.0,
+    }
+
+
+def parameter_combinations(random_samples: int = None) -> list[tuple]:
+    """Returns every combination of the parameters, or a random sample of them."""
+    combinations = list(itertools.product(SENSITIVITIES, TRIGGER_LEVELS, ACTIVATION_DELAYS))
+    if random_samples is not None and random_samples < len(combinations):
+        rng = np.random.default_rng(RANDOM_SEED)
+        indices = rng.choice(len(combinations), size=random_samples, replace=False)
+        combinations = [combinations[i] for i in sorted(indices)]
+    return combinations
+
+
+def det_curve(results: list[dict]) -> list[dict]:
+    """Returns the results that no other result beats on both false accepts and false rejects.
+    Sorted from the fewest false accepts to the fewest false rejects.
+    """
+    ordered = sorted(results, key=lambda r: (r['false_accepts_per_hour'], r['false_reject_rate']))
+    curve = []
+    for r in ordered:
+        if len(curve) == 0 or r['false_reject_rate'] < curve[-1]['false_reject_rate']:
+            curve.append(r)
+    return curve
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('predictions_path', help='Predictions saved by evaluate_recordings')
+    parser.add_argument('-r', '--random', type=int, help='Number of random combinations to try instead of the full grid')
+    parser.add_argument('-o', '--output', help='Path of a CSV file to save every result in')
+    args = parser.parse_args()
+
+    predictions, positive, durations = load_predictions(args.predictions_path)
+    combinations = parameter_combinations(args.random)
+    start = time.perf_counter()
+    results = [evaluate_parameters(predictions, positive, durations, float(s), int(l), int(d))
+               for s, l, d in combinations]
+    print(f'Evaluated {len(results)} combinations over {len(predictions)} files '
+          f'in {time.perf_counter() - start:.1f} s')
+
+    print(f'\n{"sensitivity":>12}{"level":>7}{"delay":>7}{"FA/hour":>10}{"FRR":>9}')
+    for r in det_curve(results):
+        print(f'{r["sensitivity"]:>12.2f}{r["trigger_level"]:>7}{r["activation_delay"]:>7}'
+              f'{r["false_accepts_per_hour"]:>10.3f}{r["false_reject_rate"] * 100:>8.2f}%')
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f'Saved results to {args.output}')